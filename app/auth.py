@@ -1,3 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 from jwt import encode, decode, exceptions
 from datetime import datetime, timedelta, UTC
@@ -17,6 +21,78 @@ def verify_password(plain_password, hashed_password) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordHashPool:
+    """
+    Пул потоков для bcrypt. bcrypt отпускает GIL, поэтому хэширование идет параллельно и не блокирует event loop.
+    Число одновременно выполняемых и ожидающих задач ограничено: при переполнении запрос получает 429,
+    а не встает в бесконечную очередь.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail="Too many authentication requests, try again later",
+                                headers={"Retry-After": "1"})
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        job = self._executor.submit(func, *args)
+        # слот освобождается, когда поток закончил работу, а не при отмене ожидающего запроса:
+        # отмена не останавливает уже начатое хэширование
+        job.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        return await asyncio.wrap_future(job)
+
+    def _release(self):
+        self.pending -= 1
+
+
+password_hash_pool = PasswordHashPool(workers=settings.PASSWORD_HASH_WORKERS,
+                                      max_pending=settings.PASSWORD_HASH_MAX_PENDING)
+
+
+async def async_get_password_hash(password: str) -> str:
+    return await password_hash_pool.run(get_password_hash, password)
+
+
+async def async_verify_password(plain_password, hashed_password) -> bool:
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+
+class TokenClaims:
+    """Проверенные поля JWT: пользователь, версия токена и флаги ролей на момент входа."""
+
+    __slots__ = ("id", "token_version", "is_superuser", "is_moderator", "is_banned", "expires_at")
+
+    def __init__(self, payload: dict):
+        self.id = int(payload["sub"])
+        self.token_version = payload.get("ver", 0)
+        self.is_superuser = bool(payload.get("su"))
+        self.is_moderator = bool(payload.get("mod"))
+        self.is_banned = bool(payload.get("ban"))
+        self.expires_at = int(payload["exp"])
+
+
+def user_claims(user) -> dict:
+    return {"sub": user.id, "ver": user.token_version, "su": user.is_superuser, "mod": user.is_moderator,
+            "ban": user.is_banned}
+
+
+def decode_access_token(token: str) -> TokenClaims:
+    try:
+        payload = decode(token, settings.SECRET_KEY, settings.ALGORITHM, options={"require": ["exp", "sub"]})
+    except exceptions.ExpiredSignatureError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
+    except exceptions.PyJWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unhandled exception")
+    return TokenClaims(payload)
+
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(UTC) + timedelta(minutes=180)
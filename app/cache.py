@@ -0,0 +1,284 @@
+import asyncio
+import math
+from collections import OrderedDict
+from time import monotonic
+from typing import Iterable
+
+import orjson
+from fastapi import Response
+
+
+class TTLCache:
+    """
+    Ограниченный LRU-кэш процесса с временем жизни записей и счетчиками попаданий.
+    Кэш живет в памяти одного воркера, поэтому TTL ограничивает рассинхронизацию между воркерами.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._on_evict = on_evict
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < monotonic():
+            if entry is not None:
+                del self._data[key]
+                self._evicted(key, entry[1])
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, ttl: float | None = None):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            evicted_key, (_, evicted_value) = self._data.popitem(last=False)
+            self._evicted(evicted_key, evicted_value)
+
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def _evicted(self, key, value):
+        if self._on_evict is not None:
+            self._on_evict(key, value)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CategoryRegistry:
+    """
+    Индекс категорий id -> name в памяти процесса.
+    Загружается одним запросом при первом обращении и сбрасывается при создании или удалении категории.
+    Сброс виден только своему воркеру, поэтому промах перепроверяется запросом по первичному ключу
+    (категорию могли создать в другом воркере), а удаленную в другом воркере категорию ловит внешний ключ
+    при записи. TTL ограничивает, сколько живут такие расхождения.
+    """
+
+    def __init__(self, loader, finder, ttl: float):
+        self._loader = loader
+        self._finder = finder
+        self.ttl = ttl
+        self.loads = 0
+        self.lookups = 0
+        self.fallbacks = 0
+        self._names: dict[int, str] | None = None
+        self._expires_at = 0.0
+        # растет при каждом сбросе: загрузка, начатая до сброса, не должна сохранить устаревшие данные
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._names is not None and self._expires_at > monotonic()
+
+    async def get_names(self, session=None) -> dict[int, str]:
+        if not self._is_fresh():
+            async with self._lock:
+                if not self._is_fresh():
+                    generation = self._generation
+                    categories = await self._loader(session)
+                    names = {category.id: category.name for category in categories}
+                    self.loads += 1
+                    if generation != self._generation:
+                        return names
+                    self._names = names
+                    self._expires_at = monotonic() + self.ttl
+        return self._names
+
+    async def exists(self, category_id: int, session=None) -> bool:
+        self.lookups += 1
+        if category_id in await self.get_names(session):
+            return True
+        self.fallbacks += 1
+        category = await self._finder(category_id, session)
+        if category is None:
+            return False
+        if self._names is not None:
+            self._names[category.id] = category.name
+        return True
+
+    def invalidate(self):
+        self._generation += 1
+        self._names = None
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._names) if self._names is not None else 0,
+            "loaded": self._is_fresh(),
+            "lookups": self.lookups,
+            "fallbacks": self.fallbacks,
+            "loads": self.loads,
+        }
+
+
+class CacheBackend:
+    """
+    Хранилище кэша ответов. Ключ - строка, значение - готовое тело ответа, теги - по ним записи сбрасываются.
+    Разделяемый между воркерами бэкенд (например, Redis с множествами ключей на тег) реализует те же методы.
+    """
+
+    async def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, tags: Iterable[str], ttl: float):
+        raise NotImplementedError
+
+    async def invalidate(self, tags: Iterable[str]):
+        raise NotImplementedError
+
+    async def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """
+    LRU-бэкенд в памяти процесса с индексом тег -> ключи.
+    Сбросы по тегам доходят только до кэша своего воркера: запись, изменившая данные через другой воркер,
+    здесь не видна, и ответ может оставаться устаревшим до RESPONSE_CACHE_TTL. При нескольких воркерах
+    точная инвалидация требует разделяемого бэкенда.
+    """
+
+    def __init__(self, maxsize: int):
+        self._entries = TTLCache(maxsize=maxsize, ttl=0, on_evict=self._untag)
+        self._tags: dict[str, set[str]] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    async def set(self, key: str, value: bytes, tags: Iterable[str], ttl: float):
+        tags = tuple(tags)
+        self._untag(key, self._entries.pop(key))
+        self._entries.set(key, (value, tags), ttl=ttl)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+    async def invalidate(self, tags: Iterable[str]):
+        for tag in tags:
+            for key in self._tags.pop(tag, ()):
+                self._untag(key, self._entries.pop(key))
+
+    async def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+    def _untag(self, key: str, entry):
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries._data), "maxsize": self._entries.maxsize, "tags": len(self._tags)}
+
+
+class ResponseCache:
+    """
+    Кэш JSON-ответов анонимных эндпоинтов. Ключ - эндпоинт и тело запроса,
+    записи помечаются тегами затронутых данных и сбрасываются по ним после фиксации изменений.
+
+    Чтение, начатое до фиксации изменения, могло получить старые данные, а сохранить их уже после сброса.
+    Поэтому каждый сброс получает номер поколения, запрос берет текущий номер (begin) до обращения к БД,
+    а store не сохраняет ответ, если любой из его тегов сброшен позже. Номера последних сбросов хранятся
+    для generations_size тегов; вытесненные поднимают общий порог, ниже которого ответы не сохраняются.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float, generations_size: int = 65536):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self._pending = set()
+        self._generation = 0
+        self._floor = 0
+        self._invalidated = TTLCache(maxsize=generations_size, ttl=math.inf, on_evict=self._forget)
+
+    @staticmethod
+    def make_key(endpoint: str, payload) -> str:
+        return f"{endpoint}:{payload.model_dump_json()}"
+
+    async def get(self, key: str) -> Response | None:
+        body = await self.backend.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Response(body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+    def begin(self) -> int:
+        """Поколение кэша перед чтением данных для ответа, передается в store."""
+        return self._generation
+
+    async def store(self, key: str, content, tags: Iterable[str], started: int) -> Response:
+        body = orjson.dumps(content)
+        tags = tuple(tags)
+        if self._is_current(tags, started):
+            await self.backend.set(key, body, tags, self.ttl)
+        else:
+            self.skipped += 1
+        return Response(body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+    def invalidate(self, tags: Iterable[str]):
+        """Сбросить записи с тегами. Вызывается синхронно, в том числе из обработчика фиксации транзакции."""
+        tags = tuple(tags)
+        self._generation += 1
+        for tag in tags:
+            self._invalidated.set(tag, self._generation)
+        self.schedule(self.backend.invalidate(tags))
+
+    def clear(self):
+        self._generation += 1
+        self._floor = self._generation
+        self._invalidated.clear()
+        self.schedule(self.backend.clear())
+
+    def _is_current(self, tags: tuple, started: int) -> bool:
+        if self._floor > started:
+            return False
+        return all(self._invalidated.get(tag, 0) <= started for tag in tags)
+
+    def _forget(self, tag: str, generation: int):
+        self._floor = max(self._floor, generation)
+
+    def schedule(self, coroutine):
+        """Запустить сброс из синхронного обработчика фиксации транзакции, не теряя ссылку на задачу."""
+        task = asyncio.ensure_future(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "skipped_stale": self.skipped,
+            **self.backend.stats(),
+        }
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Literal
 
 from pydantic_settings import BaseSettings
 
@@ -19,6 +19,51 @@ class Settings(BaseSettings):
 
     SU_EMAIL: List[str]
 
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 100  # 0 для работы через pgbouncer в transaction mode
+
+    DB_CONNECTION_BUDGET: int = 0  # общий лимит соединений всех воркеров, 0 - пул каждого воркера по DB_POOL_*
+
+    WEB_WORKERS: int = 0  # 0 - по числу доступных ядер
+    WEB_MAX_REQUESTS: int = 10000
+    WEB_MAX_REQUESTS_JITTER: int = 1000
+
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL: float = 30
+    TOKEN_CACHE_SIZE: int = 4096
+    TOKEN_VERSION_TTL: float = 10  # сколько другие воркеры могут принимать отозванный токен
+    CATEGORY_REGISTRY_TTL: float = 300
+    CATEGORY_STATS_REFRESH_SECONDS: float = 300  # 0 - обновлять только заданием refresh_category_stats
+    RESPONSE_CACHE_SIZE: int = 4096
+    RESPONSE_CACHE_TTL: float = 30
+
+    SSE_BUFFER_SIZE: int = 100  # сообщений на подписчика, при переполнении подписчик отключается
+    SSE_KEEPALIVE_SECONDS: float = 15
+    COMMENTS_NOTIFY_ENABLED: bool = False  # рассылка через LISTEN/NOTIFY между воркерами
+
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 32
+
+    MODERATION_BATCH_LIMIT: int = 1000
+    REVIEW_LEASE_SECONDS: int = 300
+    REVIEW_CLAIM_LIMIT: int = 20
+    REVIEW_SCORE_GRAVITY: float = 1.5  # чем больше, тем быстрее старые жалобы уступают свежим
+
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_ACK: Literal["flushed", "queued"] = "flushed"
+    WRITE_BEHIND_BATCH_SIZE: int = 500
+    WRITE_BEHIND_FLUSH_INTERVAL: float = 0.05
+    WRITE_BEHIND_MAX_PENDING: int = 10000
+
+    SQL_PROFILER_ENABLED: bool = False
+    SQL_PROFILER_STATEMENT_BUDGET: int = 10
+    SQL_PROFILER_REPEAT_THRESHOLD: int = 3
+    SQL_PROFILER_SLOW_MS: float = 100
+
     class Config:
         env_file = ".env-non-dev"
 
@@ -1,10 +1,122 @@
+from contextlib import asynccontextmanager
+from time import perf_counter
+
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import DeclarativeBase, sessionmaker
-from app.config import DATABASE_URL
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.config import DATABASE_URL, settings
+
+
+class PoolStats:
+    """Счетчики ожидания соединений из пула, общие для процесса (воркера)."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, waited: float):
+        self.checkouts += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    def snapshot(self) -> dict:
+        return {
+            "checkouts_total": self.checkouts,
+            "checkout_timeouts_total": self.timeouts,
+            "checkout_wait_seconds_total": round(self.wait_total, 6),
+            "checkout_wait_seconds_avg": round(self.wait_total / self.checkouts, 6) if self.checkouts else 0.0,
+            "checkout_wait_seconds_max": round(self.wait_max, 6),
+        }
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул, замеряющий время получения соединения (ожидание свободного слота или открытие нового)."""
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        pool_stats.record(perf_counter() - started)
+        return connection
 
-engine = create_async_engine(DATABASE_URL)
+
+engine = create_async_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedPool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args={
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    },
+)
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
 
 
 class Base(DeclarativeBase):  # аккумулирует данные о моделях, что-то вроде папки migrations
     pass
+
+
+def get_pool_status() -> dict:
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        **pool_stats.snapshot(),
+    }
+
+
+@asynccontextmanager
+async def session_scope(session: AsyncSession | None = None, commit: bool = False):
+    """
+    Отдает сессию запроса, если она передана, иначе открывает собственную.
+    Собственная сессия фиксируется на выходе при commit=True. Чужую фиксирует её владелец,
+    поэтому здесь изменения только сбрасываются в БД (flush) и видны следующим запросам той же транзакции.
+    """
+    if session is not None:
+        yield session
+        if commit:
+            await session.flush()
+        return
+    async with async_session_maker() as own_session:
+        yield own_session
+        if commit:
+            await own_session.commit()
+
+
+def call_after_commit(session: AsyncSession | None, callback):
+    """
+    Выполнить callback после фиксации транзакции сессии запроса, например сбросить кэш.
+    Без сессии запроса CRUD-методы фиксируют изменения сами, поэтому callback вызывается сразу.
+    """
+    if session is None:
+        callback()
+        return
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session):
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_commit(session):
+    session.info.pop("after_commit", None)
@@ -1,118 +1,548 @@
-from .database import async_session_maker
-from .models import User, Advertisement, Comment, Category, Report, SUserEmails
-from sqlalchemy import select, insert
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import (select, insert, update, delete, values, column, any_, literal, ARRAY, Float, Integer, func,
+                        and_, or_, case, cast, text)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from .database import async_session_maker, session_scope
+from .models import User, Advertisement, Comment, Category, Report, SUserEmails, SEARCH_CONFIG, category_stats
+
+
+# Postgres принимает не больше 32767 параметров в одном запросе
+MAX_QUERY_PARAMS = 32000
+# ключ advisory lock, под которым обновляется category_stats: одновременно обновляет один воркер
+CATEGORY_STATS_LOCK = 240_301
+
+
+def any_of(column, values):
+    """column = ANY(:values) с одним параметром-массивом вместо IN со списком параметров."""
+    return column == any_(literal(list(values), ARRAY(column.type)))
 
 
 class BaseCRUD:
     model = None
+    list_columns = ()  # колонки для списков, которые отдаются без загрузки ORM-объектов
 
     @classmethod
-    async def find_by_id(cls, model_id: int):
-        async with async_session_maker() as session:
+    async def find_by_id(cls, model_id: int, session: AsyncSession | None = None):
+        async with session_scope(session) as session:
             query = select(cls.model).filter_by(id=model_id)
             result = await session.execute(query)
             return result.scalars().one_or_none()
 
     @classmethod
-    async def find_one_or_none(cls, **filter_by):
-        async with async_session_maker() as session:
+    async def find_one_or_none(cls, session: AsyncSession | None = None, **filter_by):
+        async with session_scope(session) as session:
             query = select(cls.model).filter_by(**filter_by)
             result = await session.execute(query)
             return result.scalar_one_or_none()
 
     @classmethod
-    async def get_find_all(cls, **filter_by):
-        async with async_session_maker() as session:
+    async def get_find_all(cls, session: AsyncSession | None = None, **filter_by):
+        async with session_scope(session) as session:
             query = select(cls.model).filter_by(**filter_by)
             result = await session.execute(query)
             return result.scalars().all()
 
     @classmethod
-    async def delete_by_id(cls, model_id: int):
-        async with async_session_maker() as session:
+    async def delete_by_id(cls, model_id: int, session: AsyncSession | None = None):
+        async with session_scope(session, commit=True) as session:
             obj = await session.get(cls.model, model_id)
             if obj:
                 await session.delete(obj)
-                await session.commit()
                 return {"message": "Object has been successfully deleted"}
             return {"message": "Object not found"}
 
     @classmethod
-    async def add(cls, **data):
-        async with async_session_maker() as session:
+    async def add(cls, session: AsyncSession | None = None, **data):
+        async with session_scope(session, commit=True) as session:
             query = insert(cls.model).values(**data)
             await session.execute(query)
-            await session.commit()
 
     @classmethod
-    async def update_by_id(cls, model_id: int, **update_data):
-        async with async_session_maker() as session:
+    async def bulk_add(cls, rows: list[dict], ignore_conflicts: bool = False,
+                       session: AsyncSession | None = None) -> int:
+        """
+        Вставить строки многострочными INSERT пачками в пределах лимита параметров.
+        При ignore_conflicts=True конфликтующие строки пропускаются (ON CONFLICT DO NOTHING).
+        Возвращает количество реально вставленных строк.
+        """
+        if not rows:
+            return 0
+        chunk_size = max(1, MAX_QUERY_PARAMS // len(rows[0]))
+        inserted = 0
+        async with session_scope(session, commit=True) as session:
+            for start in range(0, len(rows), chunk_size):
+                query = pg_insert(cls.model).values(rows[start:start + chunk_size])
+                if ignore_conflicts:
+                    query = query.on_conflict_do_nothing()
+                result = await session.execute(query.returning(cls.model.id))
+                inserted += len(result.all())
+        return inserted
+
+    @classmethod
+    async def find_existing_values(cls, field: str, values: list, session: AsyncSession | None = None) -> set:
+        """Вернуть те из values, что уже есть в колонке field, одним запросом WHERE field = ANY(:values)."""
+        if not values:
+            return set()
+        column = getattr(cls.model, field)
+        async with session_scope(session) as session:
+            query = select(column).where(any_of(column, values))
+            result = await session.execute(query)
+            return set(result.scalars().all())
+
+    @classmethod
+    async def update_by_id(cls, model_id: int, session: AsyncSession | None = None, **update_data):
+        async with session_scope(session, commit=True) as session:
             obj = await session.get(cls.model, model_id)
             if obj:
                 for key, value in update_data.items():
                     setattr(obj, key, value)
-                await session.commit()
                 return {"message": "Object has been successfully updated"}
             return {"message": "Object not found"}
 
     @classmethod
-    async def get_obj_with_pagination(cls, page: int, page_size: int, **filter_by):
-        async with async_session_maker() as session:
+    async def update_where_in(cls, field: str, values: list, session: AsyncSession | None = None,
+                              **update_data) -> list:
+        """Одним UPDATE ... WHERE field = ANY(:values) RETURNING id, field. Возвращает обновленные строки."""
+        if not values:
+            return []
+        column = getattr(cls.model, field)
+        async with session_scope(session, commit=True) as session:
+            query = (update(cls.model).where(any_of(column, values)).values(**update_data)
+                     .returning(cls.model.id, column).execution_options(synchronize_session=False))
+            result = await session.execute(query)
+            return result.all()
+
+    @classmethod
+    async def delete_by_ids(cls, ids: list[int], session: AsyncSession | None = None) -> list[int]:
+        """
+        Удалить объекты одним DELETE ... WHERE id = ANY(:ids) RETURNING id вместе с зависимыми строками.
+        Возвращает id реально удаленных объектов.
+        """
+        if not ids:
+            return []
+        async with session_scope(session, commit=True) as session:
+            await cls._delete_dependents(ids, session)
+            return await cls._delete_where(any_of(cls.model.id, ids), session)
+
+    @classmethod
+    async def _delete_dependents(cls, ids: list[int], session: AsyncSession):
+        """Core DELETE обходит ORM-каскады, поэтому классы с дочерними таблицами чистят их здесь."""
+
+    @classmethod
+    async def _delete_where(cls, condition, session: AsyncSession) -> list[int]:
+        query = (delete(cls.model).where(condition).returning(cls.model.id)
+                 .execution_options(synchronize_session=False))
+        result = await session.execute(query)
+        return list(result.scalars().all())
+
+    @classmethod
+    async def get_obj_with_pagination(cls, page: int, page_size: int, session: AsyncSession | None = None,
+                                      **filter_by):
+        async with session_scope(session) as session:
             query = select(cls.model).order_by(cls.model.id).filter_by(**filter_by)
             offset = (page - 1) * page_size
             items = await session.execute(query.offset(offset).limit(page_size))
             return items.scalars().all()
 
+    @classmethod
+    async def get_row(cls, model_id: int, session: AsyncSession | None = None, extra_columns=()) -> dict | None:
+        async with session_scope(session) as session:
+            query = select(*cls.list_columns, *extra_columns).select_from(cls.model).filter_by(id=model_id)
+            row = (await session.execute(query)).one_or_none()
+            return row._asdict() if row is not None else None
+
+    @classmethod
+    async def get_rows_with_pagination(cls, page: int, page_size: int, session: AsyncSession | None = None,
+                                       **filter_by):
+        async with session_scope(session) as session:
+            query = select(*cls.list_columns).select_from(cls.model).order_by(cls.model.id).filter_by(**filter_by)
+            offset = (page - 1) * page_size
+            rows = await session.execute(query.offset(offset).limit(page_size))
+            return [row._asdict() for row in rows]
+
+    @classmethod
+    async def stream_rows(cls, *conditions, chunk_size: int = 1000):
+        """
+        Отдавать строки list_columns порциями через серверный курсор (yield_per), не загружая выборку целиком.
+        Открывает собственную сессию: генератор живет дольше запроса, который его создал.
+        """
+        query = select(*cls.list_columns).select_from(cls.model).where(*conditions).order_by(cls.model.id)
+        async with async_session_maker() as session:
+            result = await session.stream(query.execution_options(yield_per=chunk_size))
+            async for partition in result.partitions():
+                yield [row._asdict() for row in partition]
+
+    @classmethod
+    async def get_rows_with_keyset(cls, page_size: int, after: int | None = None,
+                                   session: AsyncSession | None = None, **filter_by):
+        async with session_scope(session) as session:
+            query = select(*cls.list_columns).select_from(cls.model).order_by(cls.model.id).filter_by(**filter_by)
+            if after is not None:
+                query = query.where(cls.model.id > after)
+            rows = await session.execute(query.limit(page_size + 1))
+            return [row._asdict() for row in rows]
+
 
 class UserCRUD(BaseCRUD):
     model = User
 
     @classmethod
-    async def find_by_username(cls, username: str):
-        async with async_session_maker() as session:
+    def revoke_tokens(cls) -> dict:
+        """Значения для update_*: выданные пользователю токены перестают приниматься."""
+        return {"token_version": cls.model.token_version + 1}
+
+    @classmethod
+    async def get_token_version(cls, user_id: int, session: AsyncSession | None = None) -> int | None:
+        async with session_scope(session) as session:
+            query = select(cls.model.token_version).filter_by(id=user_id)
+            result = await session.execute(query)
+            return result.scalar_one_or_none()
+
+    @classmethod
+    async def find_by_username(cls, username: str, session: AsyncSession | None = None):
+        async with session_scope(session) as session:
             query = select(cls.model).filter_by(username=username)
             result = await session.execute(query)
             return result.scalars().one_or_none()
 
     @classmethod
-    async def find_by_email(cls, email: str):
-        async with async_session_maker() as session:
+    async def find_by_email(cls, email: str, session: AsyncSession | None = None):
+        async with session_scope(session) as session:
             query = select(cls.model).filter_by(email=email)
             result = await session.execute(query)
             return result.scalars().one_or_none()
 
+    @classmethod
+    async def _delete_dependents(cls, ids: list[int], session: AsyncSession):
+        adv_ids = await session.execute(select(Advertisement.id).where(any_of(Advertisement.user_id, ids)))
+        await AdvertisementCRUD.delete_by_ids(list(adv_ids.scalars().all()), session=session)
+        await CommentCRUD._delete_where(any_of(Comment.user_id, ids), session)
+        await ReportCRUD._delete_where(any_of(Report.user_id, ids), session)
+
 
 class AdvertisementCRUD(BaseCRUD):
     model = Advertisement
+    list_columns = (Advertisement.id, Advertisement.title, Advertisement.description, Advertisement.created_at,
+                    Advertisement.user_id, Advertisement.category_id, Advertisement.comment_count,
+                    Advertisement.report_count)
+
+    @classmethod
+    async def update_by_id(cls, model_id: int, session: AsyncSession | None = None, **update_data):
+        return await super().update_by_id(model_id, session=session, version=cls.model.version + 1, **update_data)
+
+    @classmethod
+    async def get_version(cls, adv_id: int, session: AsyncSession | None = None) -> int | None:
+        async with session_scope(session) as session:
+            result = await session.execute(select(cls.model.version).filter_by(id=adv_id))
+            return result.scalar_one_or_none()
+
+    @classmethod
+    async def change_counters(cls, field: str, deltas: dict[int, int], session: AsyncSession | None = None,
+                              touch: str | None = None):
+        """
+        Применить приращения счетчика field ({id объявления: delta}) одним UPDATE ... FROM (VALUES ...).
+        Вместе со счетчиком растет version объявления, а колонка touch, если задана, получает now()
+        у объявлений с положительным приращением.
+        Несколько объявлений сначала блокируются в порядке id: UPDATE берет строки в порядке плана,
+        и параллельные пачки отложенной записи или удаления иначе могут заблокировать друг друга.
+        Блокировка FOR NO KEY UPDATE, как у самого UPDATE: FOR UPDATE конфликтует с FOR KEY SHARE, который
+        проверка внешнего ключа INSERT дочерних строк уже взяла в соседней пачке, и это взаимная блокировка.
+        """
+        deltas = {adv_id: delta for adv_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        counter = getattr(cls.model, field)
+        data = values(column("id", Integer), column("delta", Integer), name="deltas").data(list(deltas.items()))
+        changes = {field: counter + data.c.delta, "version": cls.model.version + 1}
+        if touch is not None:
+            changes[touch] = case((data.c.delta > 0, func.now()), else_=getattr(cls.model, touch))
+        query = (update(cls.model).where(cls.model.id == data.c.id).values(changes)
+                 .execution_options(synchronize_session=False))
+        async with session_scope(session, commit=True) as session:
+            if len(deltas) > 1:
+                await session.execute(select(cls.model.id).where(any_of(cls.model.id, deltas))
+                                      .order_by(cls.model.id).with_for_update())
+            await session.execute(query)
+
+    @classmethod
+    async def reconcile_counters(cls, after_id: int = 0, batch_size: int = 1000,
+                                 session: AsyncSession | None = None) -> tuple[int, int | None]:
+        """
+        Пересчитать счетчики для следующей пачки объявлений с id > after_id и исправить расхождения.
+        Возвращает (число исправленных объявлений, id последнего объявления пачки или None, если пачек больше нет).
+        """
+        async with session_scope(session, commit=True) as session:
+            ids = await session.execute(
+                select(cls.model.id).where(cls.model.id > after_id).order_by(cls.model.id).limit(batch_size)
+            )
+            ids = ids.scalars().all()
+            if not ids:
+                return 0, None
+            comments = select(func.count(Comment.id)).where(Comment.advertisement_id == cls.model.id).scalar_subquery()
+            reports = select(func.count(Report.id)).where(Report.advertisement_id == cls.model.id).scalar_subquery()
+            query = (update(cls.model)
+                     .where(cls.model.id.between(ids[0], ids[-1]))
+                     .where(or_(cls.model.comment_count != comments, cls.model.report_count != reports))
+                     .values(comment_count=comments, report_count=reports, version=cls.model.version + 1)
+                     .returning(cls.model.id)
+                     .execution_options(synchronize_session=False))
+            fixed = await session.execute(query)
+            return len(fixed.all()), ids[-1]
+
+    @classmethod
+    async def get_most_reported(cls, page_size: int, after: tuple | None = None,
+                                session: AsyncSession | None = None):
+        """Объявления с жалобами по убыванию report_count, курсор after - пара (report_count, id)."""
+        query = select(*cls.list_columns).where(cls.model.report_count > 0)
+        if after is not None:
+            last_count, last_id = after
+            query = query.where(or_(cls.model.report_count < last_count,
+                                    and_(cls.model.report_count == last_count, cls.model.id > last_id)))
+        async with session_scope(session) as session:
+            rows = await session.execute(query.order_by(cls.model.report_count.desc(), cls.model.id)
+                                         .limit(page_size + 1))
+            return [row._asdict() for row in rows]
+
+    @classmethod
+    async def get_detail(cls, adv_id: int, comments_page_size: int, session: AsyncSession | None = None) -> dict | None:
+        """
+        Объявление с автором, категорией и первой страницей комментариев ровно за два запроса:
+        объявление с автором и категорией одним SELECT с JOIN (joinedload), затем страница комментариев.
+        """
+        query = (select(cls.model).options(joinedload(cls.model.user), joinedload(cls.model.category))
+                 .filter_by(id=adv_id))
+        async with session_scope(session) as session:
+            advertisement = (await session.execute(query)).scalars().one_or_none()
+            if advertisement is None:
+                return None
+            comments = await CommentCRUD.get_rows_with_keyset(comments_page_size, session=session,
+                                                              advertisement_id=adv_id)
+        detail = {col.key: getattr(advertisement, col.key) for col in cls.list_columns}
+        author, category = advertisement.user, advertisement.category
+        detail["author"] = {"id": author.id, "username": author.username} if author is not None else None
+        detail["category"] = {"id": category.id, "name": category.name} if category is not None else None
+        detail["comments"] = comments[:comments_page_size]
+        detail["has_more_comments"] = len(comments) > comments_page_size
+        return detail
+
+    @classmethod
+    def review_score(cls, gravity: float):
+        """Приоритет в очереди модерации: число жалоб, затухающее с часами, прошедшими после последней жалобы."""
+        hours = func.extract("epoch", func.now() - func.coalesce(cls.model.last_reported_at, func.now())) / 3600
+        return cast(cls.model.report_count / func.power(hours + 2, gravity), Float)
+
+    @classmethod
+    async def get_review_queue(cls, limit: int, gravity: float, session: AsyncSession | None = None) -> list[dict]:
+        """Объявления с жалобами по убыванию приоритета вместе с текущей арендой модератора, если она есть."""
+        score = cls.review_score(gravity)
+        query = (select(*cls.list_columns, cls.model.last_reported_at, cls.model.review_claimed_by,
+                        cls.model.review_lease_until, score.label("score"))
+                 .where(cls.model.report_count > 0).order_by(score.desc(), cls.model.id).limit(limit))
+        async with session_scope(session) as session:
+            rows = await session.execute(query)
+            return [row._asdict() for row in rows]
+
+    @classmethod
+    async def claim_for_review(cls, moderator_id: int, limit: int, lease_seconds: int, gravity: float,
+                               session: AsyncSession | None = None) -> list[dict]:
+        """
+        Взять в работу до limit объявлений с наивысшим приоритетом, не арендованных другими модераторами
+        (или с истекшей арендой). Кандидаты выбираются с FOR UPDATE SKIP LOCKED, поэтому параллельные
+        модераторы получают разные объявления и не ждут блокировок друг друга.
+        """
+        score = cls.review_score(gravity)
+        candidates = (select(cls.model.id)
+                      .where(cls.model.report_count > 0,
+                             or_(cls.model.review_lease_until.is_(None), cls.model.review_lease_until < func.now()))
+                      .order_by(score.desc(), cls.model.id).limit(limit)
+                      .with_for_update(skip_locked=True).cte("candidates"))
+        query = (update(cls.model).where(cls.model.id == candidates.c.id)
+                 .values(review_claimed_by=moderator_id,
+                         review_lease_until=func.now() + timedelta(seconds=lease_seconds))
+                 .returning(*cls.list_columns, cls.model.last_reported_at, cls.model.review_lease_until,
+                            score.label("score"))
+                 .execution_options(synchronize_session=False))
+        async with session_scope(session, commit=True) as session:
+            rows = await session.execute(query)
+            return sorted((row._asdict() for row in rows), key=lambda row: (-row["score"], row["id"]))
+
+    @classmethod
+    async def finish_review(cls, adv_id: int, moderator_id: int, session: AsyncSession | None = None) -> bool:
+        """Снять аренду объявления, если она принадлежит модератору и не истекла. False - такой аренды нет."""
+        query = (update(cls.model)
+                 .where(cls.model.id == adv_id, cls.model.review_claimed_by == moderator_id,
+                        cls.model.review_lease_until > func.now())
+                 .values(review_claimed_by=None, review_lease_until=None)
+                 .returning(cls.model.id).execution_options(synchronize_session=False))
+        async with session_scope(session, commit=True) as session:
+            result = await session.execute(query)
+            return result.scalar_one_or_none() is not None
+
+    @classmethod
+    async def search(cls, text: str, page_size: int, after: tuple | None = None, category_id: int | None = None,
+                     session: AsyncSession | None = None):
+        """
+        Полнотекстовый поиск по заголовку и описанию через GIN-индекс по search_vector.
+        Сортировка по релевантности (rank DESC, id), курсор after - пара (rank, id) последней строки.
+        Подсветка считается Postgres уже после LIMIT, только для строк страницы.
+        """
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+        rank = func.ts_rank(cls.model.search_vector, tsquery)
+        query = select(
+            *cls.list_columns,
+            rank.label("rank"),
+            func.ts_headline(SEARCH_CONFIG, func.coalesce(cls.model.title, ""), tsquery,
+                             "HighlightAll=true").label("title_highlight"),
+            func.ts_headline(SEARCH_CONFIG, func.coalesce(cls.model.description, ""), tsquery,
+                             "MaxFragments=2, MaxWords=30, MinWords=10").label("snippet"),
+        ).where(cls.model.search_vector.op("@@")(tsquery))
+        if category_id is not None:
+            query = query.where(cls.model.category_id == category_id)
+        if after is not None:
+            last_rank, last_id = literal(after[0], Float), after[1]
+            query = query.where(or_(rank < last_rank, and_(rank == last_rank, cls.model.id > last_id)))
+        async with session_scope(session) as session:
+            rows = await session.execute(query.order_by(rank.desc(), cls.model.id).limit(page_size + 1))
+            return [row._asdict() for row in rows]
+
+    @classmethod
+    async def _delete_dependents(cls, ids: list[int], session: AsyncSession):
+        await session.execute(delete(Comment).where(any_of(Comment.advertisement_id, ids)))
+        await session.execute(delete(Report).where(any_of(Report.advertisement_id, ids)))
 
 
 class CategoryCRUD(BaseCRUD):
     model = Category
 
+    @classmethod
+    async def get_stats(cls, latest: int, session: AsyncSession | None = None) -> list[dict]:
+        """Статистика всех категорий одним запросом к материализованному представлению category_stats."""
+        columns = [col for col in category_stats.c if col.key not in ("latest_ids", "trending_ids")]
+        query = select(*columns, category_stats.c.latest_ids[1:latest].label("latest_ids"),
+                       category_stats.c.trending_ids[1:latest].label("trending_ids")).order_by(category_stats.c.name)
+        async with session_scope(session) as session:
+            rows = await session.execute(query)
+            return [row._asdict() for row in rows]
 
-class ReportCRUD(BaseCRUD):
-    model = Report
+    @classmethod
+    async def refresh_stats(cls, min_age: float = 0, session: AsyncSession | None = None) -> bool:
+        """
+        Обновить category_stats без блокировки чтения (REFRESH ... CONCURRENTLY).
+        Пропускает обновление, если его уже выполняет другой процесс (advisory lock занят)
+        или представление обновлялось меньше min_age секунд назад. Возвращает True, если обновление выполнено.
+        """
+        async with session_scope(session, commit=True) as session:
+            locked = await session.execute(select(func.pg_try_advisory_xact_lock(CATEGORY_STATS_LOCK)))
+            if not locked.scalar():
+                return False
+            if min_age:
+                age = await session.execute(
+                    select(func.extract("epoch", func.now() - func.max(category_stats.c.refreshed_at)))
+                )
+                age = age.scalar()
+                if age is not None and age < min_age:
+                    return False
+            await session.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY category_stats"))
+            return True
 
     @classmethod
-    async def get_report_with_pagination(cls, page: int, page_size: int):
-        async with async_session_maker() as session:
-            query = select(cls.model).order_by(cls.model.created_at.desc())
-            offset = (page - 1) * page_size
-            items = await session.execute(query.offset(offset).limit(page_size))
-            return items.scalars().all()
+    async def _delete_dependents(cls, ids: list[int], session: AsyncSession):
+        adv_ids = await session.execute(select(Advertisement.id).where(any_of(Advertisement.category_id, ids)))
+        await AdvertisementCRUD.delete_by_ids(list(adv_ids.scalars().all()), session=session)
 
 
-class CommentCRUD(BaseCRUD):
-    model = Comment
+class AdvertisementChildCRUD(BaseCRUD):
+    """
+    Модели, число строк которых денормализовано в счетчик counter_field объявления.
+    touch_field - колонка объявления, которая получает now() при добавлении строк.
+    """
+    counter_field = None
+    touch_field = None
 
     @classmethod
-    async def get_comments_with_pagination(cls, page: int, page_size: int, advertisement_id: int):
-        async with async_session_maker() as session:
-            query = select(cls.model).filter_by(advertisement_id=advertisement_id)
+    async def add(cls, session: AsyncSession | None = None, **data) -> dict:
+        """Вставить строку и увеличить счетчик объявления. Возвращает вставленную строку (list_columns)."""
+        async with session_scope(session, commit=True) as session:
+            result = await session.execute(insert(cls.model).values(**data).returning(*cls.list_columns))
+            await AdvertisementCRUD.change_counters(cls.counter_field, {data["advertisement_id"]: 1}, session=session,
+                                                    touch=cls.touch_field)
+            return result.one()._asdict()
+
+    @classmethod
+    async def add_many(cls, rows: list[dict], session: AsyncSession | None = None) -> list[dict]:
+        """
+        Вставить строки многострочным INSERT ... RETURNING и одним UPDATE поправить счетчики объявлений.
+        Возвращает вставленные строки (list_columns) в порядке rows.
+        """
+        if not rows:
+            return []
+        async with session_scope(session, commit=True) as session:
+            query = insert(cls.model).returning(*cls.list_columns, sort_by_parameter_order=True)
+            created = [row._asdict() for row in await session.execute(query, rows)]
+            await AdvertisementCRUD.change_counters(cls.counter_field, Counter(row["advertisement_id"] for row in rows),
+                                                    session=session, touch=cls.touch_field)
+            return created
+
+    @classmethod
+    async def _delete_where(cls, condition, session: AsyncSession) -> list[int]:
+        query = (delete(cls.model).where(condition).returning(cls.model.id, cls.model.advertisement_id)
+                 .execution_options(synchronize_session=False))
+        rows = (await session.execute(query)).all()
+        deltas = Counter(row.advertisement_id for row in rows if row.advertisement_id is not None)
+        await AdvertisementCRUD.change_counters(cls.counter_field, {adv_id: -n for adv_id, n in deltas.items()},
+                                                session=session)
+        return [row.id for row in rows]
+
+
+class ReportCRUD(AdvertisementChildCRUD):
+    model = Report
+    counter_field = "report_count"
+    touch_field = "last_reported_at"
+    list_columns = (Report.id, Report.title, Report.content, Report.created_at, Report.creator_id, Report.user_id,
+                    Report.advertisement_id)
+
+    @classmethod
+    async def get_latest_for(cls, adv_ids: list[int], per_advertisement: int,
+                             session: AsyncSession | None = None) -> dict[int, list[dict]]:
+        """Последние per_advertisement жалоб на каждое из объявлений одним запросом с row_number()."""
+        if not adv_ids:
+            return {}
+        position = func.row_number().over(partition_by=cls.model.advertisement_id, order_by=cls.model.id.desc())
+        ranked = (select(*cls.list_columns, position.label("position"))
+                  .where(any_of(cls.model.advertisement_id, adv_ids)).subquery())
+        query = (select(*(ranked.c[col.key] for col in cls.list_columns))
+                 .where(ranked.c.position <= per_advertisement).order_by(ranked.c.advertisement_id, ranked.c.position))
+        grouped = {adv_id: [] for adv_id in adv_ids}
+        async with session_scope(session) as session:
+            for row in await session.execute(query):
+                grouped[row.advertisement_id].append(row._asdict())
+        return grouped
+
+    @classmethod
+    async def delete_for_advertisement(cls, adv_id: int, session: AsyncSession | None = None) -> list[int]:
+        """Удалить все жалобы на объявление (счетчик report_count уменьшается в той же транзакции)."""
+        async with session_scope(session, commit=True) as session:
+            return await cls._delete_where(cls.model.advertisement_id == adv_id, session)
+
+    @classmethod
+    async def get_report_with_pagination(cls, page: int, page_size: int, session: AsyncSession | None = None):
+        async with session_scope(session) as session:
+            query = select(cls.model).order_by(cls.model.created_at.desc(), cls.model.id)
             offset = (page - 1) * page_size
             items = await session.execute(query.offset(offset).limit(page_size))
             return items.scalars().all()
 
 
+class CommentCRUD(AdvertisementChildCRUD):
+    model = Comment
+    counter_field = "comment_count"
+    list_columns = (Comment.id, Comment.content, Comment.created_at, Comment.user_id, Comment.advertisement_id)
+
+
 class SUserEmailsCRUD(BaseCRUD):
     model = SUserEmails
@@ -1,9 +1,66 @@
+from time import time
+
 from fastapi import Request, HTTPException, Depends, status
-from jwt import decode, PyJWTError
-from datetime import datetime, UTC
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import TokenClaims, decode_access_token
 
+from app.cache import TTLCache, CategoryRegistry, ResponseCache, InMemoryCacheBackend
 from app.config import settings
-from app.dbcrud import UserCRUD
+from app.database import async_session_maker, call_after_commit, engine
+from app.dbcrud import UserCRUD, CategoryCRUD, CommentCRUD, ReportCRUD
+from app.pubsub import PubSubHub, PostgresBridge
+from app.writebehind import WriteBehindQueue
+
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+# токен -> проверенные claims, запись живет не дольше срока действия токена
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=0)
+# id пользователя -> актуальная token_version из БД
+token_versions = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.TOKEN_VERSION_TTL)
+category_registry = CategoryRegistry(loader=lambda session: CategoryCRUD.get_find_all(session=session),
+                                     finder=lambda category_id, session: CategoryCRUD.find_by_id(category_id, session),
+                                     ttl=settings.CATEGORY_REGISTRY_TTL)
+response_cache = ResponseCache(backend=InMemoryCacheBackend(maxsize=settings.RESPONSE_CACHE_SIZE),
+                               ttl=settings.RESPONSE_CACHE_TTL)
+
+# новые комментарии для SSE-подписчиков, канал - id объявления
+comment_hub = PubSubHub(buffer_size=settings.SSE_BUFFER_SIZE)
+comment_bridge = PostgresBridge(comment_hub, engine, "comments",
+                                loader=lambda comment_id: CommentCRUD.get_row(comment_id))
+
+
+def _written(tags_for_adv, publish: bool = False):
+    """Колбэк отложенной записи: сбросить кэш ответов по объявлениям записанных строк и разослать их подписчикам."""
+    def invalidate(rows: list[dict]):
+        adv_ids = {row["advertisement_id"] for row in rows}
+        tags = [tag for adv_id in adv_ids for tag in tags_for_adv(adv_id)]
+        response_cache.invalidate(tags)
+        if publish:
+            for row in rows:
+                comment_hub.publish(row["advertisement_id"], row)
+    return invalidate
+
+
+write_behind_options = dict(batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+                            flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL,
+                            max_pending=settings.WRITE_BEHIND_MAX_PENDING, ack=settings.WRITE_BEHIND_ACK)
+comment_writes = WriteBehindQueue(CommentCRUD,
+                                  on_flush=_written(lambda adv_id: (f"adv:{adv_id}", f"comments:{adv_id}"),
+                                                    publish=True),
+                                  **write_behind_options)
+report_writes = WriteBehindQueue(ReportCRUD, on_flush=_written(lambda adv_id: (f"adv:{adv_id}",)),
+                                 **write_behind_options)
+
+
+async def get_session():
+    """
+        Одна сессия и одна транзакция на запрос.
+        Транзакция фиксируется после успешного обработчика и откатывается, если он завершился исключением,
+        поэтому последовательности "проверить, затем изменить" выполняются атомарно.
+    """
+    async with async_session_maker() as session:
+        yield session
+        await session.commit()
 
 
 def get_token(request: Request):
@@ -13,21 +70,74 @@ def get_token(request: Request):
     return token
 
 
-async def get_current_user(token: str = Depends(get_token)):
-    try:
-        payload = decode(token, settings.SECRET_KEY, settings.ALGORITHM)
-    except PyJWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unhandled exception")
-    expire: str = payload.get('exp')
-    if not expire or (int(expire) < datetime.now(UTC).timestamp()):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
-    user_id = payload.get("sub")
-    if not user_id:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unrecognized user")
-    user = await UserCRUD.find_by_id(int(user_id))
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No user found")
+async def get_current_claims(token: str = Depends(get_token),
+                             session: AsyncSession = Depends(get_session)) -> TokenClaims:
+    """
+        Проверенные claims токена без загрузки пользователя.
+        Подпись проверяется один раз на токен, дальше claims берутся из token_cache до истечения exp.
+        Отзыв токенов сверяется с token_version пользователя, которая кэшируется на TOKEN_VERSION_TTL.
+    """
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = decode_access_token(token)
+        token_cache.set(token, claims, ttl=claims.expires_at - time())
+    version = token_versions.get(claims.id)
+    if version is None:
+        version = await UserCRUD.get_token_version(claims.id, session=session)
+        if version is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No user found")
+        token_versions.set(claims.id, version)
+    if claims.token_version != version:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+    return claims
+
+
+async def get_current_user(claims: TokenClaims = Depends(get_current_claims),
+                           session: AsyncSession = Depends(get_session)):
+    user = user_cache.get(claims.id)
+    if user is None:
+        user = await UserCRUD.find_by_id(claims.id, session=session)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No user found")
+        user_cache.set(user.id, user)
     return user
 
 
+def evict_user(user_id: int, session: AsyncSession | None = None):
+    """
+    Убрать пользователя и версию его токенов из кэшей после фиксации изменений,
+    чтобы бан или смена прав действовали в этом воркере сразу, а в остальных через TOKEN_VERSION_TTL.
+    """
+    def evict():
+        user_cache.pop(user_id)
+        token_versions.pop(user_id)
+
+    call_after_commit(session, evict)
+
+
+def invalidate_categories(session: AsyncSession | None = None):
+    """Сбросить реестр категорий после фиксации создания или удаления категории."""
+    call_after_commit(session, category_registry.invalidate)
+
+
+def invalidate_responses(*tags: str, session: AsyncSession | None = None):
+    """
+    Сбросить кэшированные ответы с любым из тегов после фиксации изменений.
+    Теги: adv:{id} - ответы, содержащие объявление; comments:{id} - страницы комментариев объявления;
+    {scope}, {scope}:offset, {scope}:tail - все, OFFSET- и последние страницы списка,
+    где scope - advs или advs:cat:{id}.
+    """
+    call_after_commit(session, lambda: response_cache.invalidate(tags))
+
+
+def publish_comment(comment: dict, session: AsyncSession | None = None):
+    """Разослать созданный комментарий SSE-подписчикам объявления после фиксации транзакции."""
+    call_after_commit(session, lambda: comment_hub.publish(comment["advertisement_id"], comment))
+
+
+def clear_responses(session: AsyncSession | None = None):
+    """Сбросить весь кэш ответов после массовых изменений, затрагивающих неизвестный набор объявлений."""
+    call_after_commit(session, response_cache.clear)
+
+
 user = get_current_user()
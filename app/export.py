@@ -0,0 +1,44 @@
+import csv
+import io
+from datetime import date
+
+import orjson
+from sqlalchemy import select
+
+from app.models import Advertisement
+
+
+def export_filters(model, category_id: int | None = None, date_from: date | None = None,
+                   date_to: date | None = None) -> list:
+    """Условия выгрузки. Комментарии и жалобы фильтруются по категории через своё объявление."""
+    conditions = []
+    if category_id is not None:
+        if model is Advertisement:
+            conditions.append(Advertisement.category_id == category_id)
+        else:
+            conditions.append(model.advertisement_id.in_(
+                select(Advertisement.id).where(Advertisement.category_id == category_id)
+            ))
+    if date_from is not None:
+        conditions.append(model.created_at >= date_from)
+    if date_to is not None:
+        conditions.append(model.created_at <= date_to)
+    return conditions
+
+
+async def encode_ndjson(chunks):
+    async for rows in chunks:
+        yield b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+
+async def encode_csv(chunks, fieldnames: list[str]):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    async for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import sys
+
+from app.dbcrud import AdvertisementCRUD, CategoryCRUD
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_advertisement_counters(batch_size: int = 1000) -> int:
+    """
+    Пройти все объявления пачками по id и исправить разошедшиеся comment_count/report_count.
+    Каждая пачка фиксируется отдельно, чтобы не держать длинную транзакцию и блокировки.
+    Возвращает общее число исправленных объявлений.
+    """
+    fixed_total, after_id = 0, 0
+    while after_id is not None:
+        fixed, after_id = await AdvertisementCRUD.reconcile_counters(after_id=after_id, batch_size=batch_size)
+        fixed_total += fixed
+    logger.info("Advertisement counters reconciled, fixed %s rows", fixed_total)
+    return fixed_total
+
+
+async def refresh_category_stats(min_age: float = 0) -> bool:
+    """Обновить материализованную статистику категорий. Подходит для cron: параллельные запуски пропускаются."""
+    refreshed = await CategoryCRUD.refresh_stats(min_age=min_age)
+    logger.info("Category stats %s", "refreshed" if refreshed else "refresh skipped")
+    return refreshed
+
+
+async def run_periodically(job, interval: float, **kwargs):
+    """Выполнять задание каждые interval секунд, пока задачу не отменят. Ошибка одного запуска не прерывает цикл."""
+    while True:
+        try:
+            await job(**kwargs)
+        except Exception:
+            logger.exception("Periodic job %s failed", job.__name__)
+        await asyncio.sleep(interval)
+
+
+JOBS = {
+    "reconcile_counters": reconcile_advertisement_counters,
+    "refresh_category_stats": refresh_category_stats,
+}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 2 or sys.argv[1] not in JOBS:
+        sys.exit(f"Usage: python -m app.jobs [{'|'.join(JOBS)}]")
+    asyncio.run(JOBS[sys.argv[1]]())
@@ -1,7 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.dependences import (user_cache, token_cache, category_registry, response_cache, comment_writes,
+                             report_writes, comment_bridge, comment_hub)
+from app.jobs import run_periodically, refresh_category_stats
+from app.metrics import MetricsMiddleware, metrics, collect_gauges
+from app.profiler import SQLProfilerMiddleware
 from app.routers import user, adv, admin
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.WRITE_BEHIND_ENABLED:
+        comment_writes.start()
+        report_writes.start()
+    if settings.COMMENTS_NOTIFY_ENABLED:
+        await comment_bridge.start()
+    refresher = None
+    if settings.CATEGORY_STATS_REFRESH_SECONDS:
+        # каждый воркер запускает цикл, но свежее представление и занятая блокировка пропускаются
+        refresher = asyncio.create_task(run_periodically(refresh_category_stats,
+                                                         settings.CATEGORY_STATS_REFRESH_SECONDS,
+                                                         min_age=settings.CATEGORY_STATS_REFRESH_SECONDS / 2))
+    yield
+    if refresher is not None:
+        refresher.cancel()
+    # штатная остановка воркера дописывает накопленные в очередях строки
+    await comment_writes.stop()
+    await report_writes.stop()
+    await comment_bridge.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+if settings.SQL_PROFILER_ENABLED:
+    app.add_middleware(SQLProfilerMiddleware)
 app.include_router(user.router)
 app.include_router(admin.router)
 app.include_router(adv.router)
+
+
+@app.get('/metrics', include_in_schema=False, response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Метрики текущего воркера в текстовом формате Prometheus: задержки и SQL-нагрузка по маршрутам,
+    состояние пула соединений, кэшей, очередей отложенной записи и рассылки комментариев.
+    Доступ к эндпоинту ограничивается на уровне прокси.
+    """
+    caches = {"users": user_cache.stats(), "tokens": token_cache.stats(), "categories": category_registry.stats(),
+              "responses": response_cache.stats()}
+    components = {"write_behind_comments": comment_writes.stats(), "write_behind_reports": report_writes.stats(),
+                  "comment_stream": comment_hub.stats()}
+    return PlainTextResponse(metrics.render(collect_gauges(caches, components)),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,184 @@
+from contextvars import ContextVar
+from time import perf_counter
+
+from sqlalchemy import event
+
+from app.database import engine, get_pool_status
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21, 34, 55)
+
+
+class RequestStats:
+    """
+    Счетчики работы с БД в рамках одного запроса. Контекстная переменная хранит ссылку на изменяемый объект,
+    поэтому приращения из гринлетов SQLAlchemy и потоков threadpool попадают в один и тот же экземпляр.
+    """
+
+    __slots__ = ("statements", "db_seconds", "checkouts")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.checkouts = 0
+
+
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            yield bound, running
+        yield "+Inf", self.total
+
+
+class Metrics:
+    """
+    Метрики запросов текущего воркера, сгруппированные по шаблону маршрута (а не по фактическому пути),
+    чтобы число серий не зависело от параметров запроса.
+    """
+
+    def __init__(self):
+        self.latency: dict[tuple, Histogram] = {}
+        self.statements: dict[tuple, Histogram] = {}
+        self.db_time: dict[tuple, Histogram] = {}
+        self.checkouts: dict[tuple, int] = {}
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        labels = (method, route, str(status))
+        self.latency.setdefault(labels, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+        self.statements.setdefault(labels[:2], Histogram(STATEMENT_BUCKETS)).observe(stats.statements)
+        self.db_time.setdefault(labels[:2], Histogram(LATENCY_BUCKETS)).observe(stats.db_seconds)
+        self.checkouts[labels[:2]] = self.checkouts.get(labels[:2], 0) + stats.checkouts
+
+    def render(self, gauges: dict[str, float] = None) -> str:
+        lines = []
+        _histogram(lines, "http_request_duration_seconds", "Request latency by route",
+                   ("method", "route", "status"), self.latency)
+        _histogram(lines, "http_request_db_statements", "SQL statements executed per request",
+                   ("method", "route"), self.statements)
+        _histogram(lines, "http_request_db_seconds", "Time spent in SQL statements per request",
+                   ("method", "route"), self.db_time)
+        lines += ["# HELP http_request_db_checkouts_total Connection pool checkouts made by requests",
+                  "# TYPE http_request_db_checkouts_total counter"]
+        for labels, value in self.checkouts.items():
+            lines.append(f"http_request_db_checkouts_total{_labels(('method', 'route'), labels)} {value}")
+        lines += ["# HELP http_requests_in_flight Requests being processed by the worker",
+                  "# TYPE http_requests_in_flight gauge",
+                  f"http_requests_in_flight {self.in_flight}"]
+        for name, value in (gauges or {}).items():
+            lines += [f"# TYPE {name} gauge", f"{name} {float(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+def _labels(names: tuple, values: tuple, **extra) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _histogram(lines: list, name: str, help_text: str, label_names: tuple, series: dict):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series.items():
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_labels(label_names, labels, le=bound)} {count}")
+        lines.append(f"{name}_sum{_labels(label_names, labels)} {round(histogram.sum, 6)}")
+        lines.append(f"{name}_count{_labels(label_names, labels)} {histogram.total}")
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: замеряет длительность запроса по маршруту и число выполняющихся запросов воркера,
+    а также собирает из событий SQLAlchemy число SQL-запросов, время в БД и число взятий соединения из пула.
+    Шаблон маршрута берется из scope["route"], который FastAPI заполняет при сопоставлении пути.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status = 500
+        started = perf_counter()
+        metrics.in_flight += 1
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.in_flight -= 1
+            # несовпавшие пути сводятся в одну серию, иначе сканеры раздувают число меток
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            metrics.observe(scope["method"], route_path, status, perf_counter() - started, stats)
+            request_stats.reset(token)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info["metrics_started"] = perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    stats = request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += perf_counter() - conn.info.pop("metrics_started")
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    stats = request_stats.get()
+    if stats is not None:
+        stats.checkouts += 1
+
+
+def collect_gauges(caches: dict, components: dict = None) -> dict:
+    """
+    Состояние пула соединений, кэшей и фоновых компонентов (очередей отложенной записи и т. п.)
+    в виде плоского набора gauge-метрик. Метрики компонента называются по его ключу в components.
+    """
+    gauges = {}
+    for key, value in get_pool_status().items():
+        gauges[f"db_pool_{key}"] = value
+    for cache_name, stats in caches.items():
+        _add_numeric(gauges, f"cache_{cache_name}", stats)
+    for name, stats in (components or {}).items():
+        _add_numeric(gauges, name, stats)
+    return gauges
+
+
+def _add_numeric(gauges: dict, prefix: str, stats: dict):
+    for key, value in stats.items():
+        if isinstance(value, (int, float)):
+            gauges[f"{prefix}_{key}"] = value
@@ -0,0 +1,40 @@
+"""added advertisement review queue
+
+Revision ID: a9d4e2b7c813
+Revises: f3a7c91d0b26
+Create Date: 2026-10-18 17:25:41.902715
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4e2b7c813'
+down_revision: Union[str, None] = 'f3a7c91d0b26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisements', sa.Column('last_reported_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('advertisements', sa.Column('review_claimed_by', sa.Integer(), nullable=True))
+    op.add_column('advertisements', sa.Column('review_lease_until', sa.DateTime(timezone=True), nullable=True))
+    op.create_foreign_key('advertisements_review_claimed_by_fkey', 'advertisements', 'users',
+                          ['review_claimed_by'], ['id'], ondelete='SET NULL')
+    # у жалоб хранится только дата, ее и берем как время последней жалобы для уже существующих данных
+    op.execute(
+        "UPDATE advertisements SET last_reported_at = latest.reported_at "
+        "FROM (SELECT advertisement_id, max(created_at)::timestamptz AS reported_at "
+        "FROM reports GROUP BY advertisement_id) AS latest "
+        "WHERE advertisements.id = latest.advertisement_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('advertisements_review_claimed_by_fkey', 'advertisements', type_='foreignkey')
+    op.drop_column('advertisements', 'review_lease_until')
+    op.drop_column('advertisements', 'review_claimed_by')
+    op.drop_column('advertisements', 'last_reported_at')
@@ -0,0 +1,63 @@
+"""added category stats view
+
+Revision ID: b2c6f8a1d340
+Revises: a9d4e2b7c813
+Create Date: 2026-10-18 18:05:13.557120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2c6f8a1d340'
+down_revision: Union[str, None] = 'a9d4e2b7c813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# created_at хранит только дату, поэтому "последние сутки" - это сегодня и вчера
+CATEGORY_STATS_QUERY = """
+WITH ads AS (
+    SELECT category_id,
+           count(*) AS advertisement_count,
+           count(*) FILTER (WHERE created_at >= current_date - 1) AS advertisements_last_day,
+           (array_agg(id ORDER BY id DESC))[1:10] AS latest_ids
+    FROM advertisements
+    GROUP BY category_id
+), recent_comments AS (
+    SELECT a.category_id, c.advertisement_id, count(*) AS comments
+    FROM comments c
+    JOIN advertisements a ON a.id = c.advertisement_id
+    WHERE c.created_at >= current_date - 1
+    GROUP BY a.category_id, c.advertisement_id
+), trending AS (
+    SELECT category_id,
+           sum(comments)::bigint AS comments_last_day,
+           (array_agg(advertisement_id ORDER BY comments DESC, advertisement_id DESC))[1:10] AS trending_ids
+    FROM recent_comments
+    GROUP BY category_id
+)
+SELECT c.id AS category_id,
+       c.name,
+       coalesce(ads.advertisement_count, 0) AS advertisement_count,
+       coalesce(ads.advertisements_last_day, 0) AS advertisements_last_day,
+       coalesce(trending.comments_last_day, 0) AS comments_last_day,
+       coalesce(ads.latest_ids, '{}') AS latest_ids,
+       coalesce(trending.trending_ids, '{}') AS trending_ids,
+       now() AS refreshed_at
+FROM categories c
+LEFT JOIN ads ON ads.category_id = c.id
+LEFT JOIN trending ON trending.category_id = c.id
+"""
+
+
+def upgrade() -> None:
+    op.execute(f"CREATE MATERIALIZED VIEW category_stats AS {CATEGORY_STATS_QUERY}")
+    # уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.execute("CREATE UNIQUE INDEX ix_category_stats_category_id ON category_stats (category_id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP MATERIALIZED VIEW category_stats")
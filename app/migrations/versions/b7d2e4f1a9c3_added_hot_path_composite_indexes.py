@@ -0,0 +1,30 @@
+"""added hot path composite indexes
+
+Revision ID: b7d2e4f1a9c3
+Revises: 39adb445aee6
+Create Date: 2026-10-18 10:12:31.402817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e4f1a9c3'
+down_revision: Union[str, None] = '39adb445aee6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_advertisements_category_id_id', 'advertisements', ['category_id', 'id'], unique=False)
+    op.create_index('ix_comments_advertisement_id_id', 'comments', ['advertisement_id', 'id'], unique=False)
+    op.create_index('ix_reports_created_at_id', 'reports', [sa.text('created_at DESC'), 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reports_created_at_id', table_name='reports')
+    op.drop_index('ix_comments_advertisement_id_id', table_name='comments')
+    op.drop_index('ix_advertisements_category_id_id', table_name='advertisements')
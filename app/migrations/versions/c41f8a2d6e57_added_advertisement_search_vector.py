@@ -0,0 +1,39 @@
+"""added advertisement search vector
+
+Revision ID: c41f8a2d6e57
+Revises: b7d2e4f1a9c3
+Create Date: 2026-10-18 12:40:05.118244
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f8a2d6e57'
+down_revision: Union[str, None] = 'b7d2e4f1a9c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisements', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.create_index('ix_advertisements_search_vector', 'advertisements', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_advertisements_search_vector', table_name='advertisements', postgresql_using='gin')
+    op.drop_column('advertisements', 'search_vector')
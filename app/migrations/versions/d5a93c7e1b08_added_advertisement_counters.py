@@ -0,0 +1,36 @@
+"""added advertisement counters
+
+Revision ID: d5a93c7e1b08
+Revises: c41f8a2d6e57
+Create Date: 2026-10-18 14:05:47.630912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a93c7e1b08'
+down_revision: Union[str, None] = 'c41f8a2d6e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisements', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('advertisements', sa.Column('report_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE advertisements AS a SET "
+        "comment_count = (SELECT count(*) FROM comments AS c WHERE c.advertisement_id = a.id), "
+        "report_count = (SELECT count(*) FROM reports AS r WHERE r.advertisement_id = a.id)"
+    )
+    op.create_index('ix_advertisements_report_count_id', 'advertisements', [sa.text('report_count DESC'), 'id'],
+                    unique=False, postgresql_where=sa.text('report_count > 0'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_advertisements_report_count_id', table_name='advertisements')
+    op.drop_column('advertisements', 'report_count')
+    op.drop_column('advertisements', 'comment_count')
@@ -0,0 +1,26 @@
+"""added advertisement version
+
+Revision ID: e8b16f4c2a95
+Revises: d5a93c7e1b08
+Create Date: 2026-10-18 15:22:19.004731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b16f4c2a95'
+down_revision: Union[str, None] = 'd5a93c7e1b08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisements', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('advertisements', 'version')
@@ -0,0 +1,26 @@
+"""added user token version
+
+Revision ID: f3a7c91d0b26
+Revises: e8b16f4c2a95
+Create Date: 2026-10-18 16:40:52.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a7c91d0b26'
+down_revision: Union[str, None] = 'e8b16f4c2a95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
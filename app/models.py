@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, Date, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import (Column, Integer, String, ForeignKey, Text, Date, DateTime, Boolean, Index, Computed, table,
+                        column, ARRAY, BigInteger)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from .database import Base
 
+SEARCH_CONFIG = "russian"
+
 
 class User(Base):
     __tablename__ = "users"
@@ -14,8 +18,11 @@ class User(Base):
     is_banned = Column(Boolean, default=False)
     is_superuser = Column(Boolean, default=False)
     is_moderator = Column(Boolean, default=False)
+    # Входит в JWT; увеличение отзывает все выданные пользователю токены
+    token_version = Column(Integer, nullable=False, default=1, server_default="1")
 
-    advertisements = relationship("Advertisement", back_populates="user", cascade="all, delete")
+    advertisements = relationship("Advertisement", back_populates="user", cascade="all, delete",
+                                  foreign_keys="Advertisement.user_id")
     comments = relationship("Comment", back_populates="user", cascade="all, delete")
     reports = relationship("Report", back_populates="user", cascade="all, delete")
 
@@ -29,12 +36,34 @@ class Advertisement(Base):
     created_at = Column(Date, server_default=func.now())
     user_id = Column(Integer, ForeignKey("users.id"))
     category_id = Column(Integer, ForeignKey("categories.id"))
+    # Денормализованные счетчики, обновляются в той же транзакции, что и комментарии/жалобы
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    report_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Растет при каждом изменении объявления или его комментариев, из него строятся ETag
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Очередь модерации: время последней жалобы для приоритета и аренда объявления модератором
+    last_reported_at = Column(DateTime(timezone=True))
+    review_claimed_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    review_lease_until = Column(DateTime(timezone=True))
+    # Генерируемая колонка для полнотекстового поиска, в обычные выборки не загружается
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')",
+        persisted=True,
+    )))
     category = relationship("Category", back_populates="advertisement")
 
-    user = relationship("User", back_populates="advertisements")
+    # вторая ссылка на users (review_claimed_by) требует явно указать ключ связи с автором
+    user = relationship("User", back_populates="advertisements", foreign_keys=[user_id])
     comments = relationship("Comment", back_populates="advertisement", cascade="all, delete")
     reports = relationship("Report", back_populates="advertisement", cascade="all, delete")
 
+    __table_args__ = (
+        Index("ix_advertisements_category_id_id", category_id, id),
+        Index("ix_advertisements_search_vector", search_vector, postgresql_using="gin"),
+        Index("ix_advertisements_report_count_id", report_count.desc(), id, postgresql_where=report_count > 0),
+    )
+
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -48,6 +77,10 @@ class Comment(Base):
     user = relationship("User", back_populates="comments")
     advertisement = relationship("Advertisement", back_populates="comments")
 
+    __table_args__ = (
+        Index("ix_comments_advertisement_id_id", advertisement_id, id),
+    )
+
 
 class Category(Base):
     __tablename__ = "categories"
@@ -72,9 +105,28 @@ class Report(Base):
     user = relationship("User", back_populates="reports")
     advertisement = relationship("Advertisement", back_populates="reports")
 
+    __table_args__ = (
+        Index("ix_reports_created_at_id", created_at.desc(), id),
+    )
+
 
 class SUserEmails(Base):
     __tablename__ = "superusers"
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True)
+
+
+# Материализованное представление (создается миграцией), обновляется CategoryCRUD.refresh_stats.
+# Описано легковесной table(), а не моделью, чтобы autogenerate не пытался создать его как таблицу.
+category_stats = table(
+    "category_stats",
+    column("category_id", Integer),
+    column("name", String),
+    column("advertisement_count", BigInteger),
+    column("advertisements_last_day", BigInteger),
+    column("comments_last_day", BigInteger),
+    column("latest_ids", ARRAY(Integer)),
+    column("trending_ids", ARRAY(Integer)),
+    column("refreshed_at", DateTime(timezone=True)),
+)
@@ -0,0 +1,51 @@
+import base64
+import json
+import math
+from typing import Callable, Optional, Sequence
+
+from fastapi import HTTPException, status
+
+# ключи курсоров сравниваются с колонками integer, больший int драйвер не передаст
+MAX_CURSOR_INT = 2 ** 31 - 1
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _is_cursor_value(value, expected: type) -> bool:
+    if isinstance(value, bool):
+        return False
+    if expected is float:
+        return isinstance(value, (int, float)) and math.isfinite(value)
+    return isinstance(value, int) and -MAX_CURSOR_INT - 1 <= value <= MAX_CURSOR_INT
+
+
+def decode_cursor(token: Optional[str], types: Sequence[type] = (int,)) -> Optional[tuple]:
+    """
+        Раскодировать непрозрачный курсор `after`, выданный клиенту в `next_cursor`.
+        types - ожидаемые типы значений ключа сортировки, например (int,) для id или (float, int) для (rank, id).
+        Возвращает None для первой страницы и кидает 400, если курсор поврежден.
+    """
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        values = None
+    if (not isinstance(values, list) or len(values) != len(types)
+            or not all(_is_cursor_value(value, expected) for value, expected in zip(values, types))):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return tuple(values)
+
+
+def build_page(items: Sequence, page_size: int, key: Callable) -> dict:
+    """
+        Сформировать страницу из выборки размером page_size + 1.
+        Лишняя строка говорит о том, что следующая страница существует, и в ответ не попадает.
+    """
+    has_more = len(items) > page_size
+    items = list(items[:page_size])
+    next_cursor = encode_cursor(*key(items[-1])) if has_more else None
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,140 @@
+import logging
+import re
+import sys
+import traceback
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from time import perf_counter
+
+from greenlet import getcurrent
+from sqlalchemy import event
+
+from app.config import settings
+from app.database import engine
+
+logger = logging.getLogger("app.sql_profiler")
+
+APP_DIR = str(Path(__file__).resolve().parent)
+ORIGIN_DEPTH = 3
+
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|\?")
+_PLACEHOLDER_LIST = re.compile(r"\(\?(?:, \?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Форма запроса: текст без конкретных плейсхолдеров и длины списков IN (...)."""
+    shape = _WHITESPACE.sub(" ", _PLACEHOLDER.sub("?", statement)).strip()
+    return _PLACEHOLDER_LIST.sub("(?, ...)", shape)
+
+
+def _origin() -> tuple[str, ...]:
+    """
+    Ближайшие к запросу кадры стека из кода приложения (без самого профилировщика).
+    Async-движок вызывает события в дочернем greenlet, стек которого начинается с greenlet_spawn,
+    поэтому кадры вызывающего кода берутся у родительского greenlet, ожидающего выполнения запроса.
+    """
+    current = getcurrent()
+    top = current.parent.gr_frame if current.parent is not None else sys._getframe(1)
+    frames = [frame for frame in traceback.extract_stack(top)
+              if frame.filename.startswith(APP_DIR) and not frame.filename.endswith("profiler.py")]
+    return tuple(f"{Path(frame.filename).name}:{frame.lineno} in {frame.name}" for frame in frames[-ORIGIN_DEPTH:])
+
+
+class QueryTrace:
+    """Запросы, выполненные внутри track_queries: форма, длительность и место вызова в коде."""
+
+    def __init__(self):
+        self.queries: list[tuple[str, float, tuple]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    def findings(self, budget: int = None, repeat_threshold: int = None, slow_ms: float = None) -> list[str]:
+        budget = settings.SQL_PROFILER_STATEMENT_BUDGET if budget is None else budget
+        repeat_threshold = settings.SQL_PROFILER_REPEAT_THRESHOLD if repeat_threshold is None else repeat_threshold
+        slow_ms = settings.SQL_PROFILER_SLOW_MS if slow_ms is None else slow_ms
+        findings = []
+        if self.count > budget:
+            findings.append(f"{self.count} statements, budget is {budget}")
+        shapes = Counter(shape for shape, _, _ in self.queries)
+        for shape, times in shapes.items():
+            if times >= repeat_threshold:
+                origins = {origin for query_shape, _, origin in self.queries if query_shape == shape}
+                findings.append(f"repeated {times}x (possible N+1): {shape}\n" + _format_origins(origins))
+        for shape, duration, origin in self.queries:
+            if duration * 1000 >= slow_ms:
+                findings.append(f"slow {duration * 1000:.1f} ms: {shape}\n" + _format_origins({origin}))
+        return findings
+
+    def assert_clean(self, **limits):
+        """Для тестов: падает с отчетом, если запросов больше бюджета, есть повторы или медленные запросы."""
+        findings = self.findings(**limits)
+        assert not findings, "\n".join(findings)
+
+
+def _format_origins(origins: set) -> str:
+    return "\n".join("    at " + " <- ".join(reversed(origin)) for origin in origins)
+
+
+_current_trace: ContextVar[QueryTrace | None] = ContextVar("sql_profiler_trace", default=None)
+
+# последние отчеты о проблемных запросах для просмотра на стенде
+profiler_reports: deque = deque(maxlen=100)
+
+
+@contextmanager
+def track_queries():
+    """
+    Собирать SQL-запросы, выполненные в текущем контексте.
+
+        with track_queries() as trace:
+            await client.post("/adv/get_comments", json=...)
+        trace.assert_clean(budget=2)
+    """
+    trace = QueryTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    if _current_trace.get() is not None:
+        conn.info["profiler_started"] = perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    trace = _current_trace.get()
+    if trace is not None and "profiler_started" in conn.info:
+        duration = perf_counter() - conn.info.pop("profiler_started")
+        trace.queries.append((statement_shape(statement), duration, _origin()))
+
+
+class SQLProfilerMiddleware:
+    """
+    ASGI-middleware для стендов и CI: трассирует SQL каждого запроса и пишет в лог (и в profiler_reports)
+    запросы, превысившие бюджет по числу выражений, повторяющие одну форму выражения или содержащие медленные.
+    Подключается только при SQL_PROFILER_ENABLED, так как разбор стека на каждом выражении недешев.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with track_queries() as trace:
+            await self.app(scope, receive, send)
+        findings = trace.findings()
+        if findings:
+            route = scope.get("route")
+            endpoint = f'{scope["method"]} {route.path if route is not None else scope["path"]}'
+            profiler_reports.append({"endpoint": endpoint, "statements": trace.count, "findings": findings})
+            logger.warning("%s: %d SQL statements\n%s", endpoint, trace.count, "\n".join(findings))
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY принимает не больше 8000 байт, длинные сообщения передаются ссылкой и догружаются получателем
+NOTIFY_PAYLOAD_LIMIT = 7500
+
+
+class Subscriber:
+    """
+    Подписка на канал с ограниченным буфером пар (id события, JSON сообщения).
+    None в буфере означает, что подписчик отключен хабом.
+    """
+
+    def __init__(self, channel, buffer_size: int):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.evicted = False
+
+    async def get(self):
+        return await self.queue.get()
+
+    def evict(self):
+        self.evicted = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class PubSubHub:
+    """
+    Рассылка сообщений подписчикам внутри процесса. Сообщение сериализуется один раз на все подписки.
+    Подписчик, не успевающий разбирать буфер (buffer_size сообщений), отключается, а не замедляет остальных
+    и не копит память. С мостом (PostgresBridge) сообщения идут через LISTEN/NOTIFY и доходят до подписчиков
+    всех воркеров, включая отправивший.
+    """
+
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self.bridge = None
+        self._channels: dict[object, set[Subscriber]] = {}
+        self._pending = set()
+        self.published = 0
+        self.evicted = 0
+
+    def subscribe(self, channel) -> Subscriber:
+        subscriber = Subscriber(channel, self.buffer_size)
+        self._channels.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._channels.get(subscriber.channel)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._channels[subscriber.channel]
+
+    def publish(self, channel, message: dict):
+        """Опубликовать сообщение. Вызывается синхронно, в том числе из обработчика фиксации транзакции."""
+        if self.bridge is not None:
+            self.schedule(self.bridge.send(channel, message))
+        else:
+            self.deliver(channel, orjson.dumps(message).decode(), message.get("id"))
+
+    def deliver(self, channel, data: str, event_id=None):
+        self.published += 1
+        for subscriber in list(self._channels.get(channel, ())):
+            if subscriber.evicted:
+                continue
+            try:
+                subscriber.queue.put_nowait((event_id, data))
+            except asyncio.QueueFull:
+                self.evicted += 1
+                subscriber.evict()
+
+    def schedule(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self._channels),
+            "subscribers": sum(len(subscribers) for subscribers in self._channels.values()),
+            "published": self.published,
+            "evicted": self.evicted,
+            "bridge": self.bridge is not None,
+        }
+
+
+class PostgresBridge:
+    """
+    Мост хаба через LISTEN/NOTIFY: на отдельном соединении воркер слушает pg_channel и отправляет в него
+    сообщения, поэтому подписчики всех воркеров gunicorn получают одно и то же.
+    Если сообщение длиннее лимита NOTIFY, передается только ссылка, а получатель загружает его через loader.
+    """
+
+    def __init__(self, hub: PubSubHub, engine, pg_channel: str, loader=None):
+        self.hub = hub
+        self.engine = engine
+        self.pg_channel = pg_channel
+        self.loader = loader
+        self._connection = None
+        self._driver_connection = None
+        self._lock = None
+
+    async def start(self):
+        self._connection = await self.engine.connect()
+        self._driver_connection = (await self._connection.get_raw_connection()).driver_connection
+        await self._driver_connection.add_listener(self.pg_channel, self._on_notify)
+        # на одном соединении asyncpg нельзя выполнять запросы параллельно
+        self._lock = asyncio.Lock()
+        self.hub.bridge = self
+
+    async def stop(self):
+        self.hub.bridge = None
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    async def send(self, channel, message: dict):
+        payload = orjson.dumps({"channel": channel, "message": message})
+        if len(payload) > NOTIFY_PAYLOAD_LIMIT:
+            payload = orjson.dumps({"channel": channel, "ref": message["id"]})
+        try:
+            async with self._lock:
+                await self._driver_connection.execute("SELECT pg_notify($1, $2)", self.pg_channel, payload.decode())
+        except Exception:
+            logger.exception("Failed to publish to %s", self.pg_channel)
+
+    def _on_notify(self, connection, pid, pg_channel, payload: str):
+        envelope = orjson.loads(payload)
+        if "message" in envelope:
+            message = envelope["message"]
+            self.hub.deliver(envelope["channel"], orjson.dumps(message).decode(), message.get("id"))
+        elif self.loader is not None:
+            self.hub.schedule(self._load_and_deliver(envelope["channel"], envelope["ref"]))
+
+    async def _load_and_deliver(self, channel, ref):
+        message = await self.loader(ref)
+        if message is not None:
+            self.hub.deliver(channel, orjson.dumps(message).decode(), message.get("id"))
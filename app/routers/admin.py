@@ -1,9 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends
-
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import get_pool_status
+from app.profiler import profiler_reports
+from app.export import export_filters, encode_ndjson, encode_csv
+from app.jobs import reconcile_advertisement_counters
 from app.dbcrud import UserCRUD, AdvertisementCRUD, CommentCRUD, CategoryCRUD, ReportCRUD, SUserEmailsCRUD
-from app.dependences import get_current_user
+from app.dependences import (get_current_claims, get_session, evict_user, user_cache, token_cache,
+                             category_registry, invalidate_categories, response_cache, invalidate_responses,
+                             clear_responses)
+from app.pagination import decode_cursor, build_page
 from app.schemas import (SChangeState, SDelete, SCreateCategory, SMoveCategory, SObjListUnfiltered,
-                         SGetItem, SEmailUsage, SUserEmails)
+                         SGetItem, SEmailUsage, SUserEmails, SBatchChangeState, SBatchDelete, SObjCursorUnfiltered,
+                         SAdvPage, SReviewClaim, SReviewResolve)
 
 router = APIRouter(
     prefix="/admin",
@@ -11,9 +26,31 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+STATE_CHANGES = {
+    "ban": {"is_banned": True},
+    "unban": {"is_banned": False},
+    "promote": {"is_moderator": True},
+    "demote": {"is_moderator": False},
+}
+
+DELETE_TARGETS = {
+    "user": UserCRUD,
+    "adv": AdvertisementCRUD,
+    "comment": CommentCRUD,
+    "category": CategoryCRUD,
+    "report": ReportCRUD,
+}
+
+EXPORT_TARGETS = {
+    "advertisements": AdvertisementCRUD,
+    "comments": CommentCRUD,
+    "reports": ReportCRUD,
+}
+
 
 @router.post('/change_state')
-async def change_user_state(user_data: SChangeState, current_user=Depends(get_current_user)):
+async def change_user_state(user_data: SChangeState, current_user=Depends(get_current_claims),
+                            session: AsyncSession = Depends(get_session)):
     """
         Изменить состояние пользователя на основе предоставленных данных.
 
@@ -21,7 +58,7 @@ async def change_user_state(user_data: SChangeState, current_user=Depends(get_cu
         - user_data: SChangeState
             - param: str тип изменения (ban, unban, promote, demote)
             - email: str email пользователя
-        - current_user: Depends(get_current_user)
+        - current_user: Depends(get_current_claims)
 
         Возвращает:
         - Dict: Сообщение, указывающее успешность или неуспешность изменения состояния пользователя
@@ -29,23 +66,21 @@ async def change_user_state(user_data: SChangeState, current_user=Depends(get_cu
     if current_user:
         if not current_user.is_superuser:
             raise HTTPException(status_code=403, detail="You don't have enough permission")
-        user = await UserCRUD.find_one_or_none(email=user_data.email)
+        user = await UserCRUD.find_one_or_none(email=user_data.email, session=session)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        if user_data.param == 'ban':
-            await UserCRUD.update_by_id(user.id, is_banned=True)
-        if user_data.param == 'unban':
-            await UserCRUD.update_by_id(user.id, is_banned=False)
-        if user_data.param == 'promote':
-            await UserCRUD.update_by_id(user.id, is_moderator=True)
-        if user_data.param == 'demote':
-            await UserCRUD.update_by_id(user.id, is_moderator=False)
+        if user_data.param in STATE_CHANGES:
+            # роли зашиты в токен, поэтому смена состояния отзывает выданные пользователю токены
+            await UserCRUD.update_by_id(user.id, session=session, **STATE_CHANGES[user_data.param],
+                                        **UserCRUD.revoke_tokens())
+        evict_user(user.id, session=session)
         return {"message": "User has been changed successfully"}
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
 @router.delete('/delete')
-async def delete_object(content_target: SDelete, current_user=Depends(get_current_user)):
+async def delete_object(content_target: SDelete, current_user=Depends(get_current_claims),
+                        session: AsyncSession = Depends(get_session)):
     """
         Удалить объект в зависимости от типа указанного в content_target.
 
@@ -53,7 +88,7 @@ async def delete_object(content_target: SDelete, current_user=Depends(get_curren
         - content_target: SDelete
             - type: str тип объекта (comment, adv, category, report)
             - id: int ID объекта
-        - current_user: Depends(get_current_user)
+        - current_user: Depends(get_current_claims)
 
         Возвращает:
         - Dict: Сообщение об успешном или неуспешном удалении объекта
@@ -62,124 +97,363 @@ async def delete_object(content_target: SDelete, current_user=Depends(get_curren
         if current_user.is_superuser:
             data_type = content_target.type
             if data_type == 'user':
-                user = await UserCRUD.find_one_or_none(id=content_target.id)
+                user = await UserCRUD.find_one_or_none(id=content_target.id, session=session)
                 if user:
-                    await UserCRUD.delete_by_id(user.id)
+                    await UserCRUD.delete_by_ids([user.id], session=session)
+                    clear_responses(session=session)
+                    evict_user(user.id, session=session)
                     return {"message": "User has been deleted successfully"}
             if data_type == 'adv':
-                data = await AdvertisementCRUD.find_one_or_none(id=content_target.id)
+                data = await AdvertisementCRUD.find_one_or_none(id=content_target.id, session=session)
                 if data:
-                    await AdvertisementCRUD.delete_by_id(data.id)
+                    await AdvertisementCRUD.delete_by_ids([data.id], session=session)
+                    invalidate_responses(f"adv:{data.id}", f"comments:{data.id}", "advs:offset",
+                                         f"advs:cat:{data.category_id}:offset", session=session)
                     return {"message": "Advertisement has been deleted successfully"}
             if data_type == 'comment':
-                data = await CommentCRUD.find_one_or_none(id=content_target.id)
+                data = await CommentCRUD.find_one_or_none(id=content_target.id, session=session)
                 if data:
-                    await CommentCRUD.delete_by_id(data.id)
+                    await CommentCRUD.delete_by_ids([data.id], session=session)
+                    invalidate_responses(f"adv:{data.advertisement_id}", f"comments:{data.advertisement_id}",
+                                         session=session)
                     return {"message": "Comment has been deleted successfully"}
             if data_type == 'category':
-                data = await CategoryCRUD.find_one_or_none(id=content_target.id)
+                data = await CategoryCRUD.find_one_or_none(id=content_target.id, session=session)
                 if data:
-                    await CategoryCRUD.delete_by_id(data.id)
+                    await CategoryCRUD.delete_by_ids([data.id], session=session)
+                    invalidate_categories(session=session)
+                    clear_responses(session=session)
                     return {"message": "Category has been deleted successfully"}
             if data_type == 'report':
-                data = await ReportCRUD.find_one_or_none(id=content_target.id)
+                data = await ReportCRUD.find_one_or_none(id=content_target.id, session=session)
                 if data:
-                    await ReportCRUD.delete_by_id(data.id)
+                    await ReportCRUD.delete_by_ids([data.id], session=session)
+                    invalidate_responses(f"adv:{data.advertisement_id}", session=session)
                     return {"message": "Report has been deleted successfully"}
             raise HTTPException(status_code=404, detail="Object not found")
         raise HTTPException(status_code=403, detail="You don't have enough permission")
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
+@router.post('/batch/change_state')
+async def batch_change_user_state(target: SBatchChangeState, current_user=Depends(get_current_claims),
+                                  session: AsyncSession = Depends(get_session)):
+    """
+        Изменить состояние списка пользователей одним запросом UPDATE ... WHERE email = ANY(...).
+
+        Параметры:
+        - target: SBatchChangeState
+            - param: str тип изменения (ban, unban, promote, demote)
+            - emails: List[str] не больше MODERATION_BATCH_LIMIT адресов
+        - current_user: Depends(get_current_claims)
+
+        Возвращает:
+        - Dict: results - статус по каждому email (updated или not_found) и количество измененных пользователей
+    """
+    if current_user:
+        if current_user.is_superuser:
+            rows = await UserCRUD.update_where_in("email", target.emails, session=session,
+                                                  **STATE_CHANGES[target.param], **UserCRUD.revoke_tokens())
+            updated = {row.email: row.id for row in rows}
+            for user_id in updated.values():
+                evict_user(user_id, session=session)
+            return {"results": {email: "updated" if email in updated else "not_found" for email in target.emails},
+                    "updated": len(updated)}
+        raise HTTPException(status_code=403, detail="You don't have enough permission")
+    raise HTTPException(status_code=401, detail="Not authorized")
+
+
+@router.delete('/batch/delete')
+async def batch_delete_objects(target: SBatchDelete, current_user=Depends(get_current_claims),
+                               session: AsyncSession = Depends(get_session)):
+    """
+        Удалить список объектов одного типа одним запросом DELETE ... WHERE id = ANY(...) RETURNING id.
+        Зависимые комментарии, жалобы и объявления удаляются в той же транзакции.
+
+        Параметры:
+        - target: SBatchDelete
+            - type: str тип объектов (user, adv, comment, category, report)
+            - ids: List[int] не больше MODERATION_BATCH_LIMIT идентификаторов
+        - current_user: Depends(get_current_claims)
+
+        Возвращает:
+        - Dict: results - статус по каждому id (deleted или not_found) и количество удаленных объектов
+    """
+    if current_user:
+        if current_user.is_superuser:
+            deleted = set(await DELETE_TARGETS[target.type].delete_by_ids(target.ids, session=session))
+            if target.type == 'user':
+                for user_id in deleted:
+                    evict_user(user_id, session=session)
+            if target.type == 'category' and deleted:
+                invalidate_categories(session=session)
+            if deleted:
+                clear_responses(session=session)
+            return {"results": {obj_id: "deleted" if obj_id in deleted else "not_found" for obj_id in target.ids},
+                    "deleted": len(deleted)}
+        raise HTTPException(status_code=403, detail="You don't have enough permission")
+    raise HTTPException(status_code=401, detail="Not authorized")
+
+
 @router.post('/create_cat')
-async def create_category(cat_name: SCreateCategory, current_user=Depends(get_current_user)):
+async def create_category(cat_name: SCreateCategory, current_user=Depends(get_current_claims),
+                          session: AsyncSession = Depends(get_session)):
     """
         Создать категорию с указанным именем, если текущий пользователь имеет на это разрешение.
 
         Параметры:
         - cat_name: SCreateCategory
-        - current_user: Depends(get_current_user)
+        - current_user: Depends(get_current_claims)
 
         Возвращает:
         - Dict: Сообщение об успешном или неуспешном создании категории
     """
     if current_user:
         if current_user.is_superuser:
-            category = await CategoryCRUD.find_one_or_none(name=cat_name.name)
+            category = await CategoryCRUD.find_one_or_none(name=cat_name.name, session=session)
             if category:
                 raise HTTPException(status_code=409, detail="Category already exists")
-            await CategoryCRUD.add(name=cat_name.name)
+            await CategoryCRUD.add(name=cat_name.name, session=session)
+            invalidate_categories(session=session)
             return {"message": f"Category {cat_name.name} has been created successfully"}
         raise HTTPException(status_code=403, detail="You don't have enough permission")
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
 @router.post("/move_item_to_category")
-async def switch_advertisement_category(move_data: SMoveCategory, current_user=Depends(get_current_user)):
+async def switch_advertisement_category(move_data: SMoveCategory, current_user=Depends(get_current_claims),
+                                        session: AsyncSession = Depends(get_session)):
     """
         Переместить объявление в указанную категорию, если текущий пользователь имеет на это разрешение.
 
         Параметры:
         - move_data: SMoveCategory
-        - current_user: Depends(get_current_user)
+        - current_user: Depends(get_current_claims)
 
         Возвращает:
         - Dict: Сообщение об успешном или неуспешном перемещении объявления в категорию
     """
     if current_user:
         if current_user.is_superuser or current_user.is_moderator:
-            adv = await AdvertisementCRUD.find_one_or_none(id=move_data.adv_id)
+            adv = await AdvertisementCRUD.find_one_or_none(id=move_data.adv_id, session=session)
             if not adv:
                 raise HTTPException(status_code=404, detail="Advertisement not found")
-            cat = await CategoryCRUD.find_one_or_none(id=move_data.target_cat)
-            if not cat:
+            if not await category_registry.exists(move_data.target_cat, session=session):
+                raise HTTPException(status_code=404, detail="Category not found")
+            previous_category_id = adv.category_id
+            try:
+                await AdvertisementCRUD.update_by_id(adv.id, category_id=move_data.target_cat, session=session)
+            except IntegrityError:
+                # категорию удалили в другом воркере после проверки по реестру
+                category_registry.invalidate()
                 raise HTTPException(status_code=404, detail="Category not found")
-            await AdvertisementCRUD.update_by_id(adv.id, category_id=cat.id)
+            invalidate_responses(f"adv:{adv.id}", f"advs:cat:{previous_category_id}:offset",
+                                 f"advs:cat:{move_data.target_cat}", session=session)
             return {"message": "Advertisement has been moved to the category successfully"}
         raise HTTPException(status_code=403, detail="You don't have enough permission")
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
 @router.post('/get_reports')
-async def get_all_reports_paginated(page_data: SObjListUnfiltered, current_user=Depends(get_current_user)):
+async def get_all_reports_paginated(page_data: SObjListUnfiltered, current_user=Depends(get_current_claims),
+                                    session: AsyncSession = Depends(get_session)):
     """
         Получить все репорты с пагинацией, если текущий пользователь имеет на это разрешение.
 
         Параметры:
         - page_data: SObjListUnfiltered
-        - current_user: Depends(get_current_user)
+        - current_user: Depends(get_current_claims)
 
         Возвращает:
         - Dict: Все отчеты с пагинацией
     """
     if current_user:
         if current_user.is_superuser or current_user.is_moderator:
-            return await ReportCRUD.get_obj_with_pagination(**page_data.dict())
+            return await ReportCRUD.get_report_with_pagination(**page_data.dict(), session=session)
+        raise HTTPException(status_code=403, detail="You don't have enough permission")
+    raise HTTPException(status_code=401, detail="Not authorized")
+
+
+@router.post('/most_reported', response_model=SAdvPage, response_class=ORJSONResponse)
+async def get_most_reported_advertisements(page_data: SObjCursorUnfiltered, current_user=Depends(get_current_claims),
+                                           session: AsyncSession = Depends(get_session)):
+    """
+        Очередь модерации: объявления с жалобами по убыванию числа жалоб.
+        Читается одним запросом по индексу (report_count DESC, id) без подсчета жалоб.
+
+        Параметры:
+        - page_data: SObjCursorUnfiltered - размер страницы и курсор after.
+        - current_user: Depends(get_current_claims)
+
+        Возвращает:
+        - Dict: items - объявления со счетчиками, next_cursor - курсор следующей страницы или None.
+    """
+    if current_user:
+        if current_user.is_superuser or current_user.is_moderator:
+            after = decode_cursor(page_data.after, types=(int, int))
+            items = await AdvertisementCRUD.get_most_reported(page_size=page_data.page_size, after=after,
+                                                              session=session)
+            return ORJSONResponse(build_page(items, page_data.page_size,
+                                             key=lambda adv: (adv["report_count"], adv["id"])))
+        raise HTTPException(status_code=403, detail="You don't have enough permission")
+    raise HTTPException(status_code=401, detail="Not authorized")
+
+
+@router.get('/report_queue', response_class=ORJSONResponse)
+async def get_report_queue(limit: int = Query(50, gt=0, le=500), current_user=Depends(get_current_claims),
+                           session: AsyncSession = Depends(get_session)):
+    """
+        Очередь модерации: жалобы, сгруппированные по объявлениям, по убыванию приоритета.
+        Приоритет - число жалоб, затухающее со временем после последней жалобы (REVIEW_SCORE_GRAVITY).
+
+        Параметры:
+        - limit: int сколько объявлений вернуть
+
+        Возвращает:
+        - List: объявления со счетчиком жалоб, приоритетом score и текущей арендой модератора
+    """
+    if current_user:
+        if current_user.is_superuser or current_user.is_moderator:
+            return ORJSONResponse(await AdvertisementCRUD.get_review_queue(limit, settings.REVIEW_SCORE_GRAVITY,
+                                                                           session=session))
+        raise HTTPException(status_code=403, detail="You don't have enough permission")
+    raise HTTPException(status_code=401, detail="Not authorized")
+
+
+@router.post('/report_queue/claim', response_class=ORJSONResponse)
+async def claim_reported_advertisements(target: SReviewClaim, current_user=Depends(get_current_claims),
+                                        session: AsyncSession = Depends(get_session)):
+    """
+        Взять в работу объявления с наивысшим приоритетом из очереди модерации на REVIEW_LEASE_SECONDS.
+        Параллельные модераторы получают разные объявления (SELECT ... FOR UPDATE SKIP LOCKED);
+        объявления с истекшей арендой возвращаются в очередь.
+
+        Параметры:
+        - target: SReviewClaim
+            - limit: int не больше REVIEW_CLAIM_LIMIT объявлений
+
+        Возвращает:
+        - List: арендованные объявления со сроком аренды и последними жалобами на каждое
+    """
+    if current_user:
+        if current_user.is_superuser or current_user.is_moderator:
+            claimed = await AdvertisementCRUD.claim_for_review(current_user.id, target.limit,
+                                                               settings.REVIEW_LEASE_SECONDS,
+                                                               settings.REVIEW_SCORE_GRAVITY, session=session)
+            reports = await ReportCRUD.get_latest_for([adv["id"] for adv in claimed], per_advertisement=5,
+                                                      session=session)
+            return ORJSONResponse([{**adv, "reports": reports[adv["id"]]} for adv in claimed])
+        raise HTTPException(status_code=403, detail="You don't have enough permission")
+    raise HTTPException(status_code=401, detail="Not authorized")
+
+
+@router.post('/report_queue/resolve')
+async def resolve_reported_advertisement(target: SReviewResolve, current_user=Depends(get_current_claims),
+                                         session: AsyncSession = Depends(get_session)):
+    """
+        Завершить разбор арендованного объявления. Требует действующей аренды текущего модератора.
+        Удалять объявления и жалобы, как и в /delete, может только суперпользователь.
+
+        Параметры:
+        - target: SReviewResolve
+            - adv_id: int объявление
+            - action: str dismiss - отклонить жалобы (удаляются), remove - удалить объявление
+              (только суперпользователь), release - вернуть объявление в очередь без изменений
+
+        Возвращает:
+        - Dict: сообщение о результате; 409, если аренды нет или она истекла
+    """
+    if current_user:
+        if current_user.is_superuser or current_user.is_moderator:
+            if target.action in ("dismiss", "remove") and not current_user.is_superuser:
+                raise HTTPException(status_code=403, detail="You don't have enough permission")
+            if not await AdvertisementCRUD.finish_review(target.adv_id, current_user.id, session=session):
+                raise HTTPException(status_code=409, detail="Advertisement is not claimed by you or the lease expired")
+            if target.action == "dismiss":
+                await ReportCRUD.delete_for_advertisement(target.adv_id, session=session)
+                invalidate_responses(f"adv:{target.adv_id}", session=session)
+            if target.action == "remove":
+                advertisement = await AdvertisementCRUD.find_one_or_none(id=target.adv_id, session=session)
+                await AdvertisementCRUD.delete_by_ids([target.adv_id], session=session)
+                invalidate_responses(f"adv:{target.adv_id}", f"comments:{target.adv_id}", "advs:offset",
+                                     f"advs:cat:{advertisement.category_id}:offset", session=session)
+            return {"message": "Review has been resolved"}
+        raise HTTPException(status_code=403, detail="You don't have enough permission")
+    raise HTTPException(status_code=401, detail="Not authorized")
+
+
+@router.post('/reconcile_counters')
+async def reconcile_counters(background_tasks: BackgroundTasks, current_user=Depends(get_current_claims)):
+    """
+        Запустить в фоне сверку счетчиков комментариев и жалоб объявлений с реальными данными.
+        Сверка идет пачками, каждая в своей короткой транзакции.
+    """
+    if current_user:
+        if current_user.is_superuser:
+            background_tasks.add_task(reconcile_advertisement_counters)
+            return {"message": "Counters reconciliation has been started"}
+        raise HTTPException(status_code=403, detail="You don't have enough permission")
+    raise HTTPException(status_code=401, detail="Not authorized")
+
+
+@router.get('/export/{entity}')
+async def export_objects(entity: Literal["advertisements", "comments", "reports"],
+                         fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+                         category_id: Optional[int] = None,
+                         date_from: Optional[date] = None,
+                         date_to: Optional[date] = None,
+                         current_user=Depends(get_current_claims)):
+    """
+        Потоковая выгрузка объявлений, комментариев или жалоб в NDJSON или CSV.
+        Строки читаются серверным курсором порциями и сразу отдаются клиенту,
+        поэтому потребление памяти не зависит от размера таблицы.
+
+        Параметры:
+        - entity: str что выгружать (advertisements, comments, reports)
+        - format: str формат (ndjson, csv)
+        - category_id: int необязательный фильтр по категории объявления
+        - date_from, date_to: date необязательный диапазон created_at включительно
+        - current_user: Depends(get_current_claims)
+    """
+    if current_user:
+        if current_user.is_superuser:
+            crud = EXPORT_TARGETS[entity]
+            chunks = crud.stream_rows(*export_filters(crud.model, category_id, date_from, date_to))
+            if fmt == "csv":
+                body = encode_csv(chunks, fieldnames=[col.key for col in crud.list_columns])
+                media_type = "text/csv"
+            else:
+                body = encode_ndjson(chunks)
+                media_type = "application/x-ndjson"
+            return StreamingResponse(body, media_type=media_type,
+                                     headers={"Content-Disposition": f'attachment; filename="{entity}.{fmt}"'})
         raise HTTPException(status_code=403, detail="You don't have enough permission")
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
 @router.post('/get_report')
-async def get_report_by_id(target: SGetItem, current_user=Depends(get_current_user)):
+async def get_report_by_id(target: SGetItem, current_user=Depends(get_current_claims),
+                           session: AsyncSession = Depends(get_session)):
     """
         Получить репорт по его ID, если текущий пользователь имеет на это разрешение.
 
         Параметры:
         - target: SGetItem
-        - current_user: Depends(get_current_user)
+        - current_user: Depends(get_current_claims)
 
         Возвращает:
         - Dict: Отчет по его ID
     """
     if current_user:
         if current_user.is_superuser or current_user.is_moderator:
-            return await ReportCRUD.find_one_or_none(**target.dict())
+            return await ReportCRUD.find_one_or_none(**target.dict(), session=session)
         raise HTTPException(status_code=403, detail="You don't have enough permission")
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
 @router.post('/get_user_list')
-async def get_user_list(target: SObjListUnfiltered, current_user=Depends(get_current_user)):
+async def get_user_list(target: SObjListUnfiltered, current_user=Depends(get_current_claims),
+                        session: AsyncSession = Depends(get_session)):
     """
         Функция, которая извлекает список пользователей на основе предоставленных параметров target с пагинацией.
         Требуется, чтобы текущий пользователь имел разрешения суперпользователя или модератора.
@@ -189,13 +463,14 @@ async def get_user_list(target: SObjListUnfiltered, current_user=Depends(get_cur
     """
     if current_user:
         if current_user.is_superuser or current_user.is_moderator:
-            return await UserCRUD.get_obj_with_pagination(**target.dict())
+            return await UserCRUD.get_obj_with_pagination(**target.dict(), session=session)
         raise HTTPException(status_code=403, detail="You don't have enough permission")
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
 @router.post('/get_user')
-async def get_user_by_id(target: SGetItem, current_user=Depends(get_current_user)):
+async def get_user_by_id(target: SGetItem, current_user=Depends(get_current_claims),
+                         session: AsyncSession = Depends(get_session)):
     """
         Функция для получения пользователя по ID с заданными параметрами target и current_user.
         Возвращает HTTPException с кодом состояния 403, если текущий пользователь не имеет прав суперпользователя
@@ -204,13 +479,14 @@ async def get_user_by_id(target: SGetItem, current_user=Depends(get_current_user
     """
     if current_user:
         if current_user.is_superuser or current_user.is_moderator:
-            return await UserCRUD.find_one_or_none(**target.dict())
+            return await UserCRUD.find_one_or_none(**target.dict(), session=session)
         raise HTTPException(status_code=403, detail="You don't have enough permission")
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
 @router.post('/set_superuser_list')
-async def set_superuser_list(target: SEmailUsage, current_user=Depends(get_current_user)):
+async def set_superuser_list(target: SEmailUsage, current_user=Depends(get_current_claims),
+                             session: AsyncSession = Depends(get_session)):
     """
     Функция для установки списка суперпользователей на основе предоставленного использования электронной почты.
     Принимает 'target' в качестве параметра типа SEmailUsage и 'current_user' в качестве необязательного параметра.
@@ -219,23 +495,24 @@ async def set_superuser_list(target: SEmailUsage, current_user=Depends(get_curre
     """
     if current_user:
         if current_user.is_superuser:
-            counter = 0
-            for email in target.emails:
-                super_user = await SUserEmailsCRUD.find_one_or_none(email=email)
-                if not super_user:
-                    user = await UserCRUD.find_one_or_none(email=email)
-                    if not user:
-                        await SUserEmailsCRUD.add(email=email)
-                        counter += 1
-                    continue
-                continue
-            return {"message": "Successfully added {} superuser emails".format(counter)}
+            emails = list(dict.fromkeys(target.emails))
+            listed = await SUserEmailsCRUD.find_existing_values("email", emails, session=session)
+            registered = await UserCRUD.find_existing_values("email", emails, session=session) - listed
+            new_emails = [email for email in emails if email not in listed and email not in registered]
+            counter = await SUserEmailsCRUD.bulk_add([{"email": email} for email in new_emails],
+                                                     ignore_conflicts=True, session=session)
+            return {"message": "Successfully added {} superuser emails".format(counter),
+                    "added": counter,
+                    "already_listed": len(listed),
+                    "already_registered": len(registered),
+                    "skipped_concurrently_added": len(new_emails) - counter}
         raise HTTPException(status_code=403, detail="You don't have enough permission")
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
 @router.delete('/delete_super_user_email')
-async def delete_super_user_email(target: SUserEmails, current_user=Depends(get_current_user)):
+async def delete_super_user_email(target: SUserEmails, current_user=Depends(get_current_claims),
+                                  session: AsyncSession = Depends(get_session)):
     """
     Функция для удаления суперпользователя на основе предоставленного адреса электронной почты.
     Принимает 'target' в качестве параметра типа SEmailUsage и 'current_user' в качестве параметров.
@@ -244,10 +521,50 @@ async def delete_super_user_email(target: SUserEmails, current_user=Depends(get_
     """
     if current_user:
         if current_user.is_superuser:
-            super_user_email = await SUserEmailsCRUD.find_one_or_none(email=target.email)
+            super_user_email = await SUserEmailsCRUD.find_one_or_none(email=target.email, session=session)
             if super_user_email:
-                await SUserEmailsCRUD.delete_by_id(super_user_email.id)
+                await SUserEmailsCRUD.delete_by_id(super_user_email.id, session=session)
                 return {"message": "Successfully deleted superuser email"}
             raise HTTPException(status_code=404, detail="Superuser email not found")
         raise HTTPException(status_code=403, detail="You don't have enough permission")
     raise HTTPException(status_code=401, detail="Not authorized")
+
+
+@router.get('/pool_stats')
+async def get_db_pool_stats(current_user=Depends(get_current_claims)):
+    """
+    Состояние пула соединений с БД текущего воркера: занятые, свободные и overflow-соединения,
+    а также счетчики и время ожидания соединения. Нужно для подбора числа воркеров и размера пула
+    относительно max_connections Postgres.
+    """
+    if current_user:
+        if current_user.is_superuser:
+            return get_pool_status()
+        raise HTTPException(status_code=403, detail="You don't have enough permission")
+    raise HTTPException(status_code=401, detail="Not authorized")
+
+
+@router.get('/cache_stats')
+async def get_cache_stats(current_user=Depends(get_current_claims)):
+    """
+    Размер и счетчики попаданий/промахов внутрипроцессных кэшей текущего воркера.
+    """
+    if current_user:
+        if current_user.is_superuser:
+            return {"users": user_cache.stats(), "tokens": token_cache.stats(), "categories": category_registry.stats(),
+                    "responses": response_cache.stats()}
+        raise HTTPException(status_code=403, detail="You don't have enough permission")
+    raise HTTPException(status_code=401, detail="Not authorized")
+
+
+@router.get('/sql_profile')
+async def get_sql_profile(current_user=Depends(get_current_claims)):
+    """
+    Последние запросы, на которых профилировщик SQL (SQL_PROFILER_ENABLED) обнаружил превышение бюджета,
+    повторяющиеся выражения (вероятный N+1) или медленные выражения, с местами вызова в коде.
+    """
+    if current_user:
+        if current_user.is_superuser:
+            return {"enabled": settings.SQL_PROFILER_ENABLED, "reports": list(profiler_reports)}
+        raise HTTPException(status_code=403, detail="You don't have enough permission")
+    raise HTTPException(status_code=401, detail="Not authorized")
@@ -1,8 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-
-from app.dependences import get_current_user
-from app.schemas import SObjListFiltered, SAdvCreate, SReport, SGetItem, SAdvComment, SCommentsPag, SObjListUnfiltered
-from app.dbcrud import AdvertisementCRUD, CategoryCRUD, ReportCRUD, CommentCRUD
+import asyncio
+from typing import List
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.dependences import (get_current_user, get_session, category_registry, response_cache,
+                             invalidate_responses, comment_writes, report_writes, comment_hub, publish_comment)
+from app.etag import make_etag, is_not_modified, not_modified
+from app.models import Advertisement
+from app.pagination import decode_cursor, build_page
+from app.schemas import (SObjListFiltered, SAdvCreate, SReport, SGetItem, SAdvComment, SCommentsPag,
+                         SObjListUnfiltered, SObjCursorUnfiltered, SObjCursorFiltered, SAdvOut, SAdvPage,
+                         SCommentOut, SAdvSearch, SAdvSearchPage, SCategoryStats, SAdvDetail)
+from app.dbcrud import AdvertisementCRUD, ReportCRUD, CommentCRUD, CategoryCRUD
 
 router = APIRouter(
     prefix="/adv",
@@ -11,8 +25,37 @@ router = APIRouter(
 )
 
 
-@router.post("/all")
-async def get_all_advertisements(avd_data: SObjListUnfiltered):
+def listing_tags(scope: str, rows: list, is_tail: bool, offset: bool = False) -> list[str]:
+    """
+    Теги кэша для страницы списка объявлений: по объявлению на строку, чтобы правка объявления сбрасывала
+    только страницы с ним, и теги хвоста/OFFSET-страниц, которые сдвигаются при добавлении и удалении.
+    """
+    tags = [scope] + [f"adv:{row['id']}" for row in rows]
+    if offset:
+        tags.append(f"{scope}:offset")
+    if is_tail:
+        tags.append(f"{scope}:tail")
+    return tags
+
+
+@router.get("/categories", response_model=List[SCategoryStats], response_class=ORJSONResponse)
+async def get_categories(latest: int = Query(5, ge=0, le=10), session: AsyncSession = Depends(get_session)):
+    """
+        Все категории со статистикой одним запросом к материализованному представлению category_stats:
+        число объявлений, новые объявления и комментарии за последние сутки, последние и обсуждаемые объявления.
+        Данные обновляются раз в CATEGORY_STATS_REFRESH_SECONDS, время обновления - в refreshed_at.
+
+        Параметры:
+        - latest: int сколько id последних и обсуждаемых объявлений вернуть на категорию (не больше 10)
+
+        Возвращает:
+        - List: статистика по каждой категории
+    """
+    return ORJSONResponse(await CategoryCRUD.get_stats(latest, session=session))
+
+
+@router.post("/all", response_model=List[SAdvOut], response_class=ORJSONResponse)
+async def get_all_advertisements(avd_data: SObjListUnfiltered, session: AsyncSession = Depends(get_session)):
     """
     Получить все объявления с пагинацией.
 
@@ -22,14 +65,45 @@ async def get_all_advertisements(avd_data: SObjListUnfiltered):
     Возвращает:
     - result: Результат получения объявлений с пагинацией.
     """
-    result = await AdvertisementCRUD.get_obj_with_pagination(
-        page=avd_data.page, page_size=avd_data.page_size,
+    key = response_cache.make_key("/adv/all", avd_data)
+    if (cached := await response_cache.get(key)) is not None:
+        return cached
+    started = response_cache.begin()
+    result = await AdvertisementCRUD.get_rows_with_pagination(
+        page=avd_data.page, page_size=avd_data.page_size, session=session,
     )
-    return result
+    tags = listing_tags("advs", result, offset=True, is_tail=len(result) < avd_data.page_size)
+    return await response_cache.store(key, result, tags, started)
+
+
+@router.post("/all/cursor", response_model=SAdvPage, response_class=ORJSONResponse)
+async def get_all_advertisements_cursor(avd_data: SObjCursorUnfiltered, session: AsyncSession = Depends(get_session)):
+    """
+    Получить все объявления с курсорной (keyset) пагинацией.
+    Стоимость любой страницы не зависит от глубины прокрутки, в отличие от /adv/all.
+
+    Параметры:
+    - avd_data: SObjCursorUnfiltered - размер страницы и курсор after из next_cursor предыдущего ответа.
+
+    Возвращает:
+    - Dict: items - объявления страницы, next_cursor - курсор следующей страницы или None.
+    """
+    key = response_cache.make_key("/adv/all/cursor", avd_data)
+    if (cached := await response_cache.get(key)) is not None:
+        return cached
+    started = response_cache.begin()
+    after = decode_cursor(avd_data.after)
+    items = await AdvertisementCRUD.get_rows_with_keyset(
+        page_size=avd_data.page_size, after=after[0] if after else None, session=session,
+    )
+    page = build_page(items, avd_data.page_size, key=lambda adv: (adv["id"],))
+    tags = listing_tags("advs", page["items"], is_tail=page["next_cursor"] is None)
+    return await response_cache.store(key, page, tags, started)
 
 
 @router.post("/create")
-async def create_adv(adv_data: SAdvCreate, current_user=Depends(get_current_user)):
+async def create_adv(adv_data: SAdvCreate, current_user=Depends(get_current_user),
+                     session: AsyncSession = Depends(get_session)):
     """
         Функция для создания объявления с заданными данными, если пользователь авторизован.
 
@@ -44,40 +118,57 @@ async def create_adv(adv_data: SAdvCreate, current_user=Depends(get_current_user
         - HTTPException: если пользователь не авторизован или если указанная категория не найдена
     """
     if current_user:
-        categories_list = await CategoryCRUD.get_find_all()
-        categories_ids = [i.id for i in categories_list]
-        if adv_data.category_id in categories_ids:
-            await AdvertisementCRUD.add(user_id=current_user.id, **adv_data.dict())
+        if await category_registry.exists(adv_data.category_id, session=session):
+            try:
+                await AdvertisementCRUD.add(user_id=current_user.id, **adv_data.dict(), session=session)
+            except IntegrityError:
+                # категорию удалили в другом воркере после проверки по реестру
+                category_registry.invalidate()
+                raise HTTPException(status_code=404, detail="Category not found")
+            invalidate_responses("advs:tail", f"advs:cat:{adv_data.category_id}:tail", session=session)
             return {"message": "Advertisement has been created successfully"}
         raise HTTPException(status_code=404, detail="Category not found")
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
 @router.post('/adv_report')
-async def adv_report(report_data: SReport, current_user=Depends(get_current_user)):
+async def adv_report(report_data: SReport, response: Response, current_user=Depends(get_current_user),
+                     session: AsyncSession = Depends(get_session)):
     """
         Функция для создания жалобы на объявление.
         Принимает report_data типа SReport и current_user в качестве параметров.
         Возвращает сообщение, указывающее на успешное создание жалобы.
+        При WRITE_BEHIND_ENABLED жалоба записывается пачкой вместе с соседними (см. set_comment).
     """
     if current_user:
-        advertisement = await AdvertisementCRUD.find_one_or_none(id=report_data.adv_id)
+        advertisement = await AdvertisementCRUD.find_one_or_none(id=report_data.adv_id, session=session)
         if advertisement:
             if current_user.id != advertisement.user_id:
+                if settings.WRITE_BEHIND_ENABLED:
+                    row = {"creator_id": current_user.id, "advertisement_id": advertisement.id,
+                           "title": report_data.title, "content": report_data.content,
+                           "user_id": advertisement.user_id}
+                    await session.commit()
+                    if await report_writes.submit(row) is None:
+                        response.status_code = 202
+                        return {"message": "Report has been accepted"}
+                    return {"message": "Report has been created successfully"}
                 await ReportCRUD.add(creator_id=current_user.id,
                                      advertisement_id=advertisement.id,
                                      title=report_data.title,
                                      content=report_data.content,
-                                     user_id=advertisement.user_id
+                                     user_id=advertisement.user_id,
+                                     session=session
                                      )
+                invalidate_responses(f"adv:{advertisement.id}", session=session)
                 return {"message": "Report has been created successfully"}
             raise HTTPException(status_code=403, detail="You can't report your own advertisement")
         raise HTTPException(status_code=404, detail="Advertisement not found")
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
-@router.post('/get_adv')
-async def get_advertisement_by_id(target: SGetItem):
+@router.post('/get_adv', response_model=SAdvOut, response_class=ORJSONResponse)
+async def get_advertisement_by_id(target: SGetItem, session: AsyncSession = Depends(get_session)):
     """
         Функция, которая извлекает объявление по его идентификатору.
 
@@ -87,14 +178,147 @@ async def get_advertisement_by_id(target: SGetItem):
         Возвращает:
         - объявление, если найдено, в противном случае вызывает HTTPException со статусным кодом 404.
     """
-    advertisement = await AdvertisementCRUD.find_one_or_none(**target.dict())
+    key = response_cache.make_key("/adv/get_adv", target)
+    if (cached := await response_cache.get(key)) is not None:
+        return cached
+    started = response_cache.begin()
+    advertisement = await AdvertisementCRUD.get_row(target.id, session=session)
     if advertisement:
-        return advertisement
+        return await response_cache.store(key, advertisement, [f"adv:{target.id}"], started)
     raise HTTPException(status_code=404, detail="Advertisement not found")
 
 
+@router.get('/item/{adv_id}', response_model=SAdvOut, response_class=ORJSONResponse)
+async def get_advertisement(adv_id: int, request: Request, session: AsyncSession = Depends(get_session)):
+    """
+        Получить объявление по идентификатору с поддержкой условного GET.
+        Ответ содержит ETag по версии объявления; при совпадении If-None-Match возвращается 304 без тела.
+
+        Параметры:
+        - adv_id: int идентификатор объявления
+
+        Возвращает:
+        - объявление или 304, если у клиента актуальная версия; 404, если объявление не найдено.
+    """
+    advertisement = await AdvertisementCRUD.get_row(adv_id, session=session, extra_columns=(Advertisement.version,))
+    if not advertisement:
+        raise HTTPException(status_code=404, detail="Advertisement not found")
+    etag = make_etag(adv_id, advertisement.pop("version"))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    return ORJSONResponse(advertisement, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+@router.get('/item/{adv_id}/detail', response_model=SAdvDetail, response_class=ORJSONResponse)
+async def get_advertisement_detail(adv_id: int, comments_page_size: int = Query(20, gt=0, le=100),
+                                   session: AsyncSession = Depends(get_session)):
+    """
+        Карточка объявления: объявление, автор, категория и первая страница комментариев за два SQL-запроса
+        (без повторной проверки существования объявления, как при связке /get_adv + /get_comments).
+        Следующие страницы комментариев - через /item/{adv_id}/comments.
+
+        Параметры:
+        - adv_id: int идентификатор объявления
+        - comments_page_size: int размер первой страницы комментариев
+
+        Возвращает:
+        - объявление с author, category, comments и has_more_comments; 404, если объявление не найдено.
+    """
+    detail = await AdvertisementCRUD.get_detail(adv_id, comments_page_size, session=session)
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Advertisement not found")
+    return ORJSONResponse(detail)
+
+
+@router.get('/item/{adv_id}/comments', response_model=List[SCommentOut], response_class=ORJSONResponse)
+async def get_advertisement_comments(adv_id: int, request: Request,
+                                     page: int = Query(1, ge=1),
+                                     page_size: int = Query(20, gt=0, le=100),
+                                     session: AsyncSession = Depends(get_session)):
+    """
+        Получить страницу комментариев объявления с поддержкой условного GET.
+        ETag строится из версии объявления, которая растет при каждом добавлении или удалении комментария,
+        поэтому опрос ветки без изменений стоит один запрос по первичному ключу и ответ 304 без тела.
+
+        Параметры:
+        - adv_id: int идентификатор объявления
+        - page, page_size: int номер и размер страницы
+
+        Возвращает:
+        - список комментариев или 304; 404, если объявление не найдено.
+    """
+    version = await AdvertisementCRUD.get_version(adv_id, session=session)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Advertisement not found")
+    etag = make_etag(adv_id, version, page, page_size)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    comments = await CommentCRUD.get_rows_with_pagination(page=page, page_size=page_size, advertisement_id=adv_id,
+                                                          session=session)
+    return ORJSONResponse(comments, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+@router.get('/item/{adv_id}/comments/stream')
+async def stream_advertisement_comments(adv_id: int, request: Request, session: AsyncSession = Depends(get_session)):
+    """
+        Поток новых комментариев объявления в формате server-sent events (event: comment).
+        При переподключении с заголовком Last-Event-ID сначала догружаются все пропущенные комментарии
+        (страницами по SSE_BUFFER_SIZE).
+        Подписчик с переполненным буфером (SSE_BUFFER_SIZE) получает event: evicted и отключается,
+        после чего может переподключиться с Last-Event-ID.
+
+        Параметры:
+        - adv_id: int идентификатор объявления
+
+        Возвращает:
+        - text/event-stream; 404, если объявление не найдено.
+    """
+    if await AdvertisementCRUD.get_version(adv_id, session=session) is None:
+        raise HTTPException(status_code=404, detail="Advertisement not found")
+    last_event_id = request.headers.get("last-event-id", "")
+    last_sent = int(last_event_id) if last_event_id.isdigit() else None
+
+    async def events():
+        # подписка оформляется внутри генератора, чтобы ее снял finally, и до догрузки, чтобы не пропустить
+        # комментарии, созданные между ними; такие комментарии придут дважды, повтор отбрасывается по backfilled
+        subscriber = comment_hub.subscribe(adv_id)
+        backfilled = set()
+        try:
+            yield "retry: 3000\n\n"
+            after = last_sent
+            while after is not None:
+                missed = await CommentCRUD.get_rows_with_keyset(page_size=settings.SSE_BUFFER_SIZE, after=after,
+                                                                advertisement_id=adv_id)
+                for comment in missed[:settings.SSE_BUFFER_SIZE]:
+                    backfilled.add(comment["id"])
+                    yield f"id: {comment['id']}\nevent: comment\ndata: {orjson.dumps(comment).decode()}\n\n"
+                # последняя лишняя строка только сообщает, что пропущенных больше страницы
+                after = missed[-2]["id"] if len(missed) > settings.SSE_BUFFER_SIZE else None
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscriber.get(), timeout=settings.SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    yield "event: evicted\ndata: {}\n\n"
+                    return
+                comment_id, data = item
+                # id комментариев фиксируются не по порядку, поэтому меньший id - не повтор
+                if comment_id in backfilled:
+                    backfilled.discard(comment_id)
+                    continue
+                yield f"id: {comment_id}\nevent: comment\ndata: {data}\n\n"
+        finally:
+            comment_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @router.delete('/delete_adv')
-async def delete_my_advertisement(target: SGetItem, current_user=Depends(get_current_user)):
+async def delete_my_advertisement(target: SGetItem, current_user=Depends(get_current_user),
+                                  session: AsyncSession = Depends(get_session)):
     """
         Удалить объявление, указанное в target, если текущий пользователь имеет на это разрешение.
 
@@ -106,10 +330,12 @@ async def delete_my_advertisement(target: SGetItem, current_user=Depends(get_cur
         - Dict: Сообщение, указывающее успешность или неуспешность удаления объявления
     """
     if current_user:
-        advertisement = await AdvertisementCRUD.find_one_or_none(**target.dict())
+        advertisement = await AdvertisementCRUD.find_one_or_none(**target.dict(), session=session)
         if advertisement:
             if current_user.id == advertisement.user_id:
-                await AdvertisementCRUD.delete_by_id(**target.dict())
+                await AdvertisementCRUD.delete_by_ids([advertisement.id], session=session)
+                invalidate_responses(f"adv:{advertisement.id}", f"comments:{advertisement.id}", "advs:offset",
+                                     f"advs:cat:{advertisement.category_id}:offset", session=session)
                 return {"message": "Advertisement has been deleted successfully"}
             raise HTTPException(status_code=403, detail="You don't have enough permission")
         raise HTTPException(status_code=404, detail="Advertisement not found")
@@ -117,9 +343,13 @@ async def delete_my_advertisement(target: SGetItem, current_user=Depends(get_cur
 
 
 @router.post('/set_commment')
-async def set_comment(target_data: SAdvComment, current_user=Depends(get_current_user)):
+async def set_comment(target_data: SAdvComment, response: Response, current_user=Depends(get_current_user),
+                      session: AsyncSession = Depends(get_session)):
     """
          Создать комментарий к объявлению, указанному в target_data, если текущий пользователь имеет на это разрешение.
+         При WRITE_BEHIND_ENABLED проверенный комментарий уходит в очередь отложенной записи и вставляется
+         пачкой вместе с соседними. С WRITE_BEHIND_ACK=flushed ответ приходит после фиксации пачки,
+         с WRITE_BEHIND_ACK=queued - сразу, со статусом 202.
 
          Параметры:
          - target_data: SAdvComment
@@ -129,16 +359,26 @@ async def set_comment(target_data: SAdvComment, current_user=Depends(get_current
          - Dict: Сообщение, указывающее успешность или неуспешность создания комментария
      """
     if current_user:
-        advertisement = await AdvertisementCRUD.find_one_or_none(id=target_data.advertisement_id)
+        advertisement = await AdvertisementCRUD.find_one_or_none(id=target_data.advertisement_id, session=session)
         if advertisement:
-            await CommentCRUD.add(user_id=current_user.id, **target_data.dict())
+            if settings.WRITE_BEHIND_ENABLED:
+                # завершаем читающую транзакцию, чтобы не держать соединение, пока копится пачка
+                await session.commit()
+                if await comment_writes.submit({"user_id": current_user.id, **target_data.dict()}) is None:
+                    response.status_code = 202
+                    return {"message": "Comment has been accepted"}
+                return {"message": "Comment has been created successfully"}
+            comment = await CommentCRUD.add(user_id=current_user.id, **target_data.dict(), session=session)
+            invalidate_responses(f"adv:{advertisement.id}", f"comments:{advertisement.id}", session=session)
+            publish_comment(comment, session=session)
             return {"message": "Comment has been created successfully"}
         raise HTTPException(status_code=404, detail="Advertisement not found")
     raise HTTPException(status_code=401, detail="Not authorized")
 
 
-@router.post('/get_comments')
-async def get_comments_paginated_by_adv_id(target: SCommentsPag):
+@router.post('/get_comments', response_model=List[SCommentOut], response_class=ORJSONResponse)
+async def get_comments_paginated_by_adv_id(target: SCommentsPag,
+                                           session: AsyncSession = Depends(get_session)):
     """
         Получить комментарии с пагинацией для объявления, указанного в target.
 
@@ -148,14 +388,20 @@ async def get_comments_paginated_by_adv_id(target: SCommentsPag):
         Возвращает:
         - Dict: Комментарии с пагинацией для указанного объявления
     """
-    advertisement = await AdvertisementCRUD.find_one_or_none(id=target.advertisement_id)
+    key = response_cache.make_key("/adv/get_comments", target)
+    if (cached := await response_cache.get(key)) is not None:
+        return cached
+    started = response_cache.begin()
+    advertisement = await AdvertisementCRUD.find_one_or_none(id=target.advertisement_id, session=session)
     if advertisement:
-        return await CommentCRUD.get_comments_with_pagination(**target.dict())
+        comments = await CommentCRUD.get_rows_with_pagination(**target.dict(), session=session)
+        return await response_cache.store(key, comments, [f"comments:{target.advertisement_id}"], started)
     raise HTTPException(status_code=404, detail="Advertisement not found")
 
 
-@router.post('/get_filtered_advs')
-async def get_filtered_advertisements_by_cat_id(target: SObjListFiltered):
+@router.post('/get_filtered_advs', response_model=List[SAdvOut], response_class=ORJSONResponse)
+async def get_filtered_advertisements_by_cat_id(target: SObjListFiltered,
+                                                session: AsyncSession = Depends(get_session)):
     """
         Получить отфильтрованные объявления по идентификатору категории.
 
@@ -165,5 +411,56 @@ async def get_filtered_advertisements_by_cat_id(target: SObjListFiltered):
         Возвращает:
         - List: Отфильтрованные объявления по указанному идентификатору категории
     """
-    advertisements = await AdvertisementCRUD.get_obj_with_pagination(**target.dict())
-    return advertisements
+    key = response_cache.make_key("/adv/get_filtered_advs", target)
+    if (cached := await response_cache.get(key)) is not None:
+        return cached
+    started = response_cache.begin()
+    advertisements = await AdvertisementCRUD.get_rows_with_pagination(**target.dict(), session=session)
+    tags = listing_tags(f"advs:cat:{target.category_id}", advertisements, offset=True,
+                        is_tail=len(advertisements) < target.page_size)
+    return await response_cache.store(key, advertisements, tags, started)
+
+
+@router.post('/get_filtered_advs/cursor', response_model=SAdvPage, response_class=ORJSONResponse)
+async def get_filtered_advertisements_by_cat_id_cursor(target: SObjCursorFiltered,
+                                                       session: AsyncSession = Depends(get_session)):
+    """
+        Получить отфильтрованные по категории объявления с курсорной (keyset) пагинацией.
+
+        Параметры:
+        - target: SObjCursorFiltered
+
+        Возвращает:
+        - Dict: items - объявления страницы, next_cursor - курсор следующей страницы или None.
+    """
+    key = response_cache.make_key("/adv/get_filtered_advs/cursor", target)
+    if (cached := await response_cache.get(key)) is not None:
+        return cached
+    started = response_cache.begin()
+    after = decode_cursor(target.after)
+    items = await AdvertisementCRUD.get_rows_with_keyset(
+        page_size=target.page_size, after=after[0] if after else None, category_id=target.category_id,
+        session=session,
+    )
+    page = build_page(items, target.page_size, key=lambda adv: (adv["id"],))
+    tags = listing_tags(f"advs:cat:{target.category_id}", page["items"], is_tail=page["next_cursor"] is None)
+    return await response_cache.store(key, page, tags, started)
+
+
+@router.post('/search', response_model=SAdvSearchPage, response_class=ORJSONResponse)
+async def search_advertisements(target: SAdvSearch, session: AsyncSession = Depends(get_session)):
+    """
+        Полнотекстовый поиск объявлений по заголовку и описанию с ранжированием по релевантности.
+        Запрос понимает синтаксис websearch: "фраза в кавычках", or, -исключение.
+
+        Параметры:
+        - target: SAdvSearch - текст запроса, необязательная категория, размер страницы и курсор after.
+
+        Возвращает:
+        - Dict: items - найденные объявления с rank, подсвеченными title_highlight и snippet,
+          next_cursor - курсор следующей страницы или None.
+    """
+    after = decode_cursor(target.after, types=(float, int))
+    items = await AdvertisementCRUD.search(target.query, page_size=target.page_size, after=after,
+                                           category_id=target.category_id, session=session)
+    return ORJSONResponse(build_page(items, target.page_size, key=lambda adv: (adv["rank"], adv["id"])))
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, HTTPException, Response, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.schemas import SUserRegister, SUserLogin
 from app.dbcrud import UserCRUD, SUserEmailsCRUD
-from app.auth import get_password_hash, verify_password, create_access_token
-from app.dependences import get_current_user
+from app.auth import async_get_password_hash, async_verify_password, create_access_token, user_claims
+from app.dependences import get_current_user, get_session
 
 router = APIRouter(
     prefix="/user",
@@ -14,7 +15,7 @@ router = APIRouter(
 
 
 @router.post("/register")
-async def register(user_data: SUserRegister):
+async def register(user_data: SUserRegister, session: AsyncSession = Depends(get_session)):
     """
         Зарегистрировать нового пользователя с предоставленными данными.
         Проверяет, является ли регистрируемый email суперпользователем в переменных окружения и специальной записи БД.
@@ -25,25 +26,27 @@ async def register(user_data: SUserRegister):
         Возвращает:
         - Dict: Сообщение об успешной регистрации пользователя
     """
-    user = await UserCRUD.find_one_or_none(email=user_data.email)
+    user = await UserCRUD.find_one_or_none(email=user_data.email, session=session)
     if user:
         raise HTTPException(status_code=500, detail="User with this email already exists")
-    super_user_email_list = await SUserEmailsCRUD.find_one_or_none(email=user_data.email)
+    super_user_email_list = await SUserEmailsCRUD.find_one_or_none(email=user_data.email, session=session)
+    # Завершаем читающую транзакцию и возвращаем соединение в пул на время работы bcrypt
+    await session.commit()
+    hashed_pwd = await async_get_password_hash(user_data.password)
     if user_data.email in settings.SU_EMAIL or super_user_email_list:
-        hashed_pwd = get_password_hash(user_data.password)
         await UserCRUD.add(username=user_data.username,
                            email=user_data.email,
                            hashed_password=hashed_pwd,
                            is_superuser=True,
-                           is_moderator=True)
+                           is_moderator=True,
+                           session=session)
         return {"message": "Account has been created successfully. Granted superuser permissions"}
-    hashed_pwd = get_password_hash(user_data.password)
-    await UserCRUD.add(username=user_data.username, email=user_data.email, hashed_password=hashed_pwd)
+    await UserCRUD.add(username=user_data.username, email=user_data.email, hashed_password=hashed_pwd, session=session)
     return {"message": "User has been created successfully"}
 
 
 @router.post("/login")
-async def login(response: Response, user_data: SUserLogin):
+async def login(response: Response, user_data: SUserLogin, session: AsyncSession = Depends(get_session)):
     """
         Войти в систему с предоставленными данными пользователя.
 
@@ -54,13 +57,15 @@ async def login(response: Response, user_data: SUserLogin):
         Возвращает:
         - Dict: Сообщение об успешном входе пользователя в систему
     """
-    user = await UserCRUD.find_one_or_none(email=user_data.email)
+    user = await UserCRUD.find_one_or_none(email=user_data.email, session=session)
+    # Завершаем читающую транзакцию и возвращаем соединение в пул на время работы bcrypt
+    await session.commit()
     if user:
-        if not verify_password(user_data.password, user.hashed_password):
+        if not await async_verify_password(user_data.password, user.hashed_password):
             raise HTTPException(status_code=401, detail="Wrong password")
         if user.is_banned:
             raise HTTPException(status_code=401, detail="User is banned")
-        access_token = create_access_token(data={"sub": user.id})
+        access_token = create_access_token(data=user_claims(user))
         response.set_cookie("ref_access_token", access_token)
         return {"message": "User has been logged in successfully"}
     raise HTTPException(status_code=404, detail="User not found")
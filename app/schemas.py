@@ -1,6 +1,9 @@
-from typing import List
+from datetime import date, datetime
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
+
+from app.config import settings
 
 
 class SUserRegister(BaseModel):
@@ -19,6 +22,11 @@ class SChangeState(BaseModel):
     email: EmailStr
 
 
+class SBatchChangeState(BaseModel):
+    param: Literal["ban", "unban", "promote", "demote"]
+    emails: List[EmailStr] = Field(min_length=1, max_length=settings.MODERATION_BATCH_LIMIT)
+
+
 class SObjListUnfiltered(BaseModel):
     page: int
     page_size: int
@@ -30,6 +38,17 @@ class SObjListFiltered(BaseModel):
     page_size: int
 
 
+class SObjCursorUnfiltered(BaseModel):
+    page_size: int = Field(gt=0, le=100)
+    after: Optional[str] = None
+
+
+class SObjCursorFiltered(BaseModel):
+    category_id: int
+    page_size: int = Field(gt=0, le=100)
+    after: Optional[str] = None
+
+
 class SAdvCreate(BaseModel):
     category_id: int
     title: str
@@ -41,6 +60,20 @@ class SDelete(BaseModel):
     id: int
 
 
+class SBatchDelete(BaseModel):
+    type: Literal["user", "adv", "comment", "category", "report"]
+    ids: List[int] = Field(min_length=1, max_length=settings.MODERATION_BATCH_LIMIT)
+
+
+class SReviewClaim(BaseModel):
+    limit: int = Field(default=5, gt=0, le=settings.REVIEW_CLAIM_LIMIT)
+
+
+class SReviewResolve(BaseModel):
+    adv_id: int
+    action: Literal["dismiss", "remove", "release"]
+
+
 class SCreateCategory(BaseModel):
     name: str
 
@@ -84,3 +117,73 @@ class SEmailUsage(BaseModel):
 
 class SUserEmails(BaseModel):
     email: EmailStr
+
+
+class SAdvOut(BaseModel):
+    id: int
+    title: Optional[str]
+    description: Optional[str]
+    created_at: Optional[date]
+    user_id: Optional[int]
+    category_id: Optional[int]
+    comment_count: int
+    report_count: int
+
+
+class SAuthorOut(BaseModel):
+    id: int
+    username: Optional[str]
+
+
+class SCategoryOut(BaseModel):
+    id: int
+    name: Optional[str]
+
+
+class SAdvPage(BaseModel):
+    items: List[SAdvOut]
+    next_cursor: Optional[str]
+
+
+class SAdvSearch(BaseModel):
+    query: str = Field(min_length=1, max_length=200)
+    category_id: Optional[int] = None
+    page_size: int = Field(gt=0, le=100)
+    after: Optional[str] = None
+
+
+class SAdvSearchHit(SAdvOut):
+    rank: float
+    title_highlight: str
+    snippet: str
+
+
+class SAdvSearchPage(BaseModel):
+    items: List[SAdvSearchHit]
+    next_cursor: Optional[str]
+
+
+class SCommentOut(BaseModel):
+    id: int
+    content: Optional[str]
+    created_at: Optional[date]
+    user_id: Optional[int]
+    advertisement_id: Optional[int]
+
+
+class SCategoryStats(BaseModel):
+    category_id: int
+    name: Optional[str]
+    advertisement_count: int
+    advertisements_last_day: int
+    comments_last_day: int
+    latest_ids: List[int]
+    trending_ids: List[int]
+    refreshed_at: datetime
+
+
+class SAdvDetail(SAdvOut):
+    author: Optional[SAuthorOut]
+    category: Optional[SCategoryOut]
+    comments: List[SCommentOut]
+    has_more_comments: bool
@@ -0,0 +1,7 @@
+from uvicorn.workers import UvicornWorker
+
+
+class TunedUvicornWorker(UvicornWorker):
+    """Воркер gunicorn с явным выбором uvloop и httptools вместо автоопределения uvicorn."""
+
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
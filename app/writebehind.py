@@ -0,0 +1,126 @@
+import asyncio
+import logging
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Отложенная запись пачками: проверенные строки копятся в очереди процесса и вставляются одним
+    многострочным INSERT, когда набралось batch_size строк или прошло flush_interval секунд с первой строки пачки.
+    Одна транзакция и один fsync приходятся на пачку, а не на каждую строку.
+
+    ack="flushed" - submit ждет фиксации пачки и возвращает вставленную строку (групповая фиксация);
+    ack="queued" - submit возвращает None сразу после постановки в очередь, строка может потеряться
+    при аварийном завершении процесса. При штатной остановке (stop) очередь дописывается до конца.
+    """
+
+    def __init__(self, crud, batch_size: int, flush_interval: float, max_pending: int, ack: str = "flushed",
+                 on_flush=None):
+        self.crud = crud
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.ack = ack
+        self._on_flush = on_flush
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+        self.failed_rows = 0
+        self.rejected = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._run(), name=f"write-behind-{self.crud.model.__tablename__}")
+
+    async def stop(self):
+        """Перестать принимать строки, дописать накопленное и дождаться завершения."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        await self._queue.put(None)
+        await task
+
+    async def submit(self, row: dict) -> dict | None:
+        future = asyncio.get_running_loop().create_future() if self.ack == "flushed" or not self.running else None
+        if not self.running:
+            # очередь остановлена (или не запускалась): строка пишется сразу, чтобы не потеряться после stop
+            await self._flush([(row, future)])
+        elif self._queue.full():
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Too many pending writes, try again later",
+                                headers={"Retry-After": "1"})
+        else:
+            self._queue.put_nowait((row, future))
+        if future is not None:
+            return await future
+        return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        rows = [row for row, _ in batch]
+        try:
+            created = await self.crud.add_many(rows)
+        except Exception:
+            if len(batch) == 1:
+                self._fail(batch)
+                return
+            # одна плохая строка (например, объявление удалили после проверки) не должна ронять всю пачку
+            logger.warning("Batch insert into %s failed, retrying row by row", self.crud.model.__tablename__)
+            for item in batch:
+                await self._flush([item])
+            return
+        self.flushed_rows += len(rows)
+        self.flushed_batches += 1
+        for (_, future), created_row in zip(batch, created):
+            if future is not None and not future.done():
+                future.set_result(created_row)
+        if self._on_flush is not None:
+            try:
+                self._on_flush(created)
+            except Exception:
+                logger.exception("Write-behind flush callback failed")
+
+    def _fail(self, batch: list):
+        (row, future), = batch
+        self.failed_rows += 1
+        logger.exception("Write-behind insert into %s failed: %s", self.crud.model.__tablename__, row)
+        if future is not None and not future.done():
+            future.set_exception(HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Object was not saved"))
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "flushed_rows": self.flushed_rows,
+            "flushed_batches": self.flushed_batches,
+            "failed_rows": self.failed_rows,
+            "rejected": self.rejected,
+        }
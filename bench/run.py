@@ -0,0 +1,255 @@
+"""
+Нагрузочный прогон приложения на наполненной bench.seed базе.
+
+    python -m bench.run --scenario mixed --concurrency 50 --requests 20000
+    python -m bench.run --scenario mixed --url http://127.0.0.1:8000 --concurrency 200 --duration 60
+    python -m bench.run --compare bench/results/1faf862-mixed-20240320T101500.json
+
+По умолчанию приложение вызывается в процессе через httpx.ASGITransport (без сети и без воркеров gunicorn),
+что удобно для сравнения коммитов между собой. С --url нагрузка идет на запущенный сервер, так измеряется
+масштабирование по воркерам. Итог по каждому эндпоинту (число запросов, ошибки, попадания в кэш ответов,
+RPS, p50/p95/p99) печатается и сохраняется в bench/results/<commit>-<scenario>-<время>.json.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+import httpx
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import engine
+from app.main import app
+from bench.seed import BENCH_PASSWORD, WORDS
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+class Dataset:
+    """Диапазоны id и логины наполненной базы, из которых сценарии выбирают параметры запросов."""
+
+    def __init__(self, max_adv_id: int, category_ids: list[int], emails: list[str]):
+        self.max_adv_id = max_adv_id
+        self.category_ids = category_ids
+        self.emails = emails
+
+    @classmethod
+    async def load(cls) -> "Dataset":
+        async with engine.connect() as conn:
+            max_adv_id = (await conn.execute(text("SELECT coalesce(max(id), 0) FROM advertisements"))).scalar()
+            category_ids = list((await conn.execute(text("SELECT id FROM categories"))).scalars())
+            emails = list((await conn.execute(
+                text("SELECT email FROM users WHERE email LIKE 'bench%@example.com' ORDER BY id LIMIT 10000")
+            )).scalars())
+        if not max_adv_id or not category_ids or not emails:
+            raise SystemExit("Dataset is empty, run `python -m bench.seed` first")
+        return cls(max_adv_id, category_ids, emails)
+
+    def adv_id(self) -> int:
+        return random.randint(1, self.max_adv_id)
+
+    def category_id(self) -> int:
+        return random.choice(self.category_ids)
+
+    def credentials(self) -> dict:
+        return {"email": random.choice(self.emails), "password": BENCH_PASSWORD}
+
+
+# Построители запросов сценариев: по датасету возвращают (метод, путь, json)
+def all_page(data):
+    return "POST", "/adv/all", {"page": random.randint(1, 50), "page_size": 20}
+
+
+def all_page_1000(data):
+    return "POST", "/adv/all", {"page": random.randint(1, 20), "page_size": 1000}
+
+
+def filtered_page(data):
+    return "POST", "/adv/get_filtered_advs", {"category_id": data.category_id(), "page": random.randint(1, 20),
+                                              "page_size": 20}
+
+
+def comments_page(data):
+    return "POST", "/adv/get_comments", {"advertisement_id": data.adv_id(), "page": 1, "page_size": 20}
+
+
+def search(data):
+    query = " ".join(random.sample(WORDS, 2))
+    return "POST", "/adv/search", {"query": query, "page_size": 20}
+
+
+def login(data):
+    return "POST", "/user/login", data.credentials()
+
+
+def create_adv(data):
+    return "POST", "/adv/create", {"category_id": data.category_id(), "title": "bench " + random.choice(WORDS),
+                                   "description": " ".join(random.choices(WORDS, k=30))}
+
+
+def set_comment(data):
+    return "POST", "/adv/set_commment", {"advertisement_id": data.adv_id(),
+                                         "content": " ".join(random.choices(WORDS, k=12))}
+
+
+def report(data):
+    return "POST", "/adv/adv_report", {"adv_id": data.adv_id(), "title": "bench", "content": random.choice(WORDS)}
+
+
+# Сценарий: веса запросов и нужен ли логин виртуального пользователя перед началом
+SCENARIOS = {
+    # типичная смесь чтения и записи
+    "mixed": ({all_page: 30, filtered_page: 25, comments_page: 25, login: 5, create_adv: 5, set_comment: 10}, True),
+    # одновременные логины: нагрузка на пул bcrypt и соединения с БД
+    "login_storm": ({login: 1}, False),
+    # логины вперемешку с чтением: p99 чтения показывает, не блокирует ли bcrypt event loop
+    "login_storm_mixed": ({login: 2, all_page: 1, comments_page: 1}, False),
+    # стоимость сериализации больших страниц (1000 строк), без кэша ответов
+    "serialization": ({all_page_1000: 1}, False),
+    # полнотекстовый поиск, осмысленно на базе от 1M объявлений
+    "search": ({search: 1}, False),
+    # поток комментариев и жалоб для сравнения синхронной записи и отложенной пачками
+    "write_burst": ({set_comment: 4, report: 1}, True),
+}
+
+# сценарии, которые измеряют построение ответа, а не кэш: приложение запускается с RESPONSE_CACHE_SIZE=0
+UNCACHED_SCENARIOS = {"serialization"}
+
+
+def percentile(sorted_values: list[float], share: float) -> float:
+    """Перцентиль по ближайшему рангу."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(math.ceil(share * len(sorted_values)) - 1, 0)]
+
+
+def summarize(samples: dict[str, list], elapsed: float) -> dict:
+    summary = {}
+    everything = [entry for entries in samples.values() for entry in entries]
+    for label, entries in [*sorted(samples.items()), ("total", everything)]:
+        latencies = sorted(latency for latency, _, _ in entries)
+        errors = sum(1 for _, status, _ in entries if status >= 400)
+        summary[label] = {
+            "requests": len(entries),
+            "errors": errors,
+            "cache_hits": sum(1 for _, _, hit in entries if hit),
+            "rps": round(len(entries) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        }
+    return summary
+
+
+async def virtual_user(client: httpx.AsyncClient, data: Dataset, scenario: dict, needs_login: bool,
+                       samples: dict, should_stop):
+    builders, weights = list(scenario), list(scenario.values())
+    if needs_login:
+        await client.post("/user/login", json=data.credentials())
+    while not should_stop():
+        method, path, payload = random.choices(builders, weights)[0](data)
+        started = perf_counter()
+        response = await client.request(method, path, json=payload)
+        samples.setdefault(f"{method} {path}", []).append((perf_counter() - started, response.status_code,
+                                                           response.headers.get("X-Cache") == "HIT"))
+
+
+async def run(scenario_name: str, concurrency: int, total_requests: int, duration: float, url: str | None):
+    if scenario_name in UNCACHED_SCENARIOS and not url and settings.RESPONSE_CACHE_SIZE:
+        raise SystemExit(f"Scenario {scenario_name} measures uncached responses, run it with RESPONSE_CACHE_SIZE=0")
+    data = await Dataset.load()
+    scenario, needs_login = SCENARIOS[scenario_name]
+    samples: dict[str, list] = {}
+    started = perf_counter()
+
+    def should_stop():
+        if duration:
+            return perf_counter() - started >= duration
+        return sum(len(entries) for entries in samples.values()) >= total_requests
+
+    async def run_users(make_client):
+        clients = [make_client() for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*(virtual_user(client, data, scenario, needs_login, samples, should_stop)
+                                   for client in clients))
+        finally:
+            for client in clients:
+                await client.aclose()
+
+    if url:
+        await run_users(lambda: httpx.AsyncClient(base_url=url, timeout=60))
+    else:
+        transport = httpx.ASGITransport(app=app)
+        # ASGITransport не отправляет lifespan-события, поэтому запуск и остановка приложения выполняются явно
+        async with app.router.lifespan_context(app):
+            await run_users(lambda: httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60))
+    summary = summarize(samples, perf_counter() - started)
+    # у запущенного сервера настройки не проверить, поэтому попадания в кэш видны по X-Cache
+    if scenario_name in UNCACHED_SCENARIOS and summary["total"]["cache_hits"]:
+        raise SystemExit(f"Scenario {scenario_name} got {summary['total']['cache_hits']} response cache hits, "
+                         f"restart the server with RESPONSE_CACHE_SIZE=0")
+    return summary
+
+
+def git_revision() -> tuple[str, bool]:
+    def git(*args):
+        return subprocess.run(["git", *args], capture_output=True, text=True).stdout.strip()
+
+    return git("rev-parse", "--short", "HEAD") or "unknown", bool(git("status", "--porcelain", "--", "app"))
+
+
+def print_table(summary: dict, baseline: dict = None):
+    header = (f"{'endpoint':40} {'requests':>9} {'errors':>7} {'hits':>7} {'rps':>9} "
+              f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print(header)
+    for label, stats in summary.items():
+        hits = stats.get("cache_hits", 0)
+        row = f"{label:40} {stats['requests']:>9} {stats['errors']:>7} {hits:>7} {stats['rps']:>9}"
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            cell = f"{stats[key]}"
+            if baseline and label in baseline and baseline[label][key]:
+                cell += f" ({(stats[key] / baseline[label][key] - 1) * 100:+.0f}%)"
+            row += f" {cell:>9}"
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a load scenario against the application")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="mixed")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=5000, help="stop after this many requests")
+    parser.add_argument("--duration", type=float, default=0, help="stop after this many seconds instead")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--compare", type=Path, help="results file to compare against")
+    parser.add_argument("--label", default="", help="free-form note saved with the results, e.g. '4 workers'")
+    args = parser.parse_args()
+
+    random.seed(0)
+    summary = asyncio.run(run(args.scenario, args.concurrency, args.requests, args.duration, args.url))
+    baseline = json.loads(args.compare.read_text())["endpoints"] if args.compare else None
+    print_table(summary, baseline)
+
+    revision, dirty = git_revision()
+    RESULTS_DIR.mkdir(exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    path = RESULTS_DIR / f"{revision}{'-dirty' if dirty else ''}-{args.scenario}-{stamp}.json"
+    path.write_text(json.dumps({
+        "commit": revision,
+        "dirty": dirty,
+        "scenario": args.scenario,
+        "concurrency": args.concurrency,
+        "target": args.url or "asgi",
+        "label": args.label,
+        "endpoints": summary,
+    }, ensure_ascii=False, indent=2))
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
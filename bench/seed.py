@@ -0,0 +1,109 @@
+"""
+Наполнение локальной БД синтетическими данными для бенчмарков.
+
+    python -m bench.seed --users 10000 --categories 50 --advertisements 1000000 --comments 2000000 --reports 50000
+
+Строки генерируются на стороне Postgres через generate_series, поэтому миллион объявлений вставляется
+за десятки секунд, а не за часы построчных INSERT. Все пользователи получают один пароль BENCH_PASSWORD
+и email вида bench<N>@example.com, чтобы сценарии нагрузки могли логиниться.
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+from app.auth import get_password_hash
+from app.database import engine
+from app.jobs import reconcile_advertisement_counters
+
+logger = logging.getLogger("bench.seed")
+
+BENCH_PASSWORD = "bench-password"
+TABLES = ("reports", "comments", "advertisements", "categories", "users")
+
+# словарь для заголовков и описаний, чтобы полнотекстовый поиск работал на похожем на реальный тексте
+WORDS = (
+    "продам", "куплю", "отдам", "срочно", "новый", "б/у", "диван", "велосипед", "ноутбук", "телефон",
+    "квартира", "гараж", "машина", "шкаф", "стол", "кресло", "холодильник", "коляска", "куртка", "книги",
+    "ремонт", "доставка", "торг", "обмен", "недорого", "отличное", "состояние", "москва", "центр", "район",
+)
+
+
+def words_expr(count: int) -> str:
+    """SQL-выражение из count случайных слов словаря."""
+    array = "ARRAY[" + ", ".join(f"'{word}'" for word in WORDS) + "]"
+    picks = [f"({array})[1 + floor(random() * {len(WORDS)})::int]" for _ in range(count)]
+    return " || ' ' || ".join(picks)
+
+
+async def seed(users: int, categories: int, advertisements: int, comments: int, reports: int,
+               reset: bool, random_seed: float):
+    password_hash = get_password_hash(BENCH_PASSWORD)
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT setseed(:seed)"), {"seed": random_seed})
+        if reset:
+            await conn.execute(text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE"))
+        user_offset = (await conn.execute(text("SELECT coalesce(max(id), 0) FROM users"))).scalar()
+        await conn.execute(text(
+            "INSERT INTO users (username, email, hashed_password, is_banned, is_superuser, is_moderator) "
+            "SELECT 'bench' || n, 'bench' || n || '@example.com', :password_hash, false, false, false "
+            "FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS n"
+        ), {"password_hash": password_hash, "start": user_offset + 1, "stop": user_offset + users})
+        await conn.execute(text(
+            "INSERT INTO categories (name) SELECT 'bench category ' || n FROM generate_series(1, :count) AS n "
+            "ON CONFLICT (name) DO NOTHING"
+        ), {"count": categories})
+        logger.info("Seeded %s users and %s categories", users, categories)
+
+        # внешние ключи выбираются случайно из диапазона id существующих строк
+        await conn.execute(text(
+            "INSERT INTO advertisements (title, description, created_at, user_id, category_id) "
+            f"SELECT {words_expr(4)}, {words_expr(30)}, current_date - (random() * 365)::int, "
+            "u.min_id + floor(random() * u.span)::int, c.min_id + floor(random() * c.span)::int "
+            "FROM generate_series(1, :count) AS n, "
+            "(SELECT min(id) AS min_id, max(id) - min(id) + 1 AS span FROM users) AS u, "
+            "(SELECT min(id) AS min_id, max(id) - min(id) + 1 AS span FROM categories) AS c"
+        ), {"count": advertisements})
+        logger.info("Seeded %s advertisements", advertisements)
+
+        ads_range = "(SELECT min(id) AS min_id, max(id) - min(id) + 1 AS span FROM advertisements) AS a"
+        users_range = "(SELECT min(id) AS min_id, max(id) - min(id) + 1 AS span FROM users) AS u"
+        await conn.execute(text(
+            "INSERT INTO comments (content, created_at, user_id, advertisement_id) "
+            f"SELECT {words_expr(12)}, current_date - (random() * 365)::int, "
+            "u.min_id + floor(random() * u.span)::int, a.min_id + floor(random() * a.span)::int "
+            f"FROM generate_series(1, :count) AS n, {users_range}, {ads_range}"
+        ), {"count": comments})
+        await conn.execute(text(
+            "INSERT INTO reports (title, content, created_at, creator_id, user_id, advertisement_id) "
+            f"SELECT {words_expr(3)}, {words_expr(10)}, current_date - (random() * 365)::int, "
+            "u.min_id + floor(random() * u.span)::int, u.min_id + floor(random() * u.span)::int, "
+            "a.min_id + floor(random() * a.span)::int "
+            f"FROM generate_series(1, :count) AS n, {users_range}, {ads_range}"
+        ), {"count": reports})
+        logger.info("Seeded %s comments and %s reports", comments, reports)
+    # счетчики комментариев и жалоб пересчитываются тем же заданием, что и в эксплуатации
+    await reconcile_advertisement_counters(batch_size=10000)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"ANALYZE {', '.join(TABLES)}"))
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with a synthetic benchmark dataset")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--advertisements", type=int, default=100_000)
+    parser.add_argument("--comments", type=int, default=200_000)
+    parser.add_argument("--reports", type=int, default=5_000)
+    parser.add_argument("--seed", type=float, default=0.42, help="Postgres setseed() value in [-1, 1]")
+    parser.add_argument("--reset", action="store_true", help="truncate application tables first")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(seed(args.users, args.categories, args.advertisements, args.comments, args.reports,
+                     args.reset, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Профиль запуска в эксплуатации: gunicorn -c gunicorn.conf.py app.main:app
+
+Число воркеров берется из WEB_WORKERS или по числу доступных процессу ядер. Приложение загружается
+в мастере до fork (preload), а пул соединений каждого воркера делится из общего DB_CONNECTION_BUDGET,
+чтобы суммарно воркеры не превысили max_connections Postgres.
+"""
+import os
+
+from app.config import settings
+
+
+def available_cpus() -> int:
+    # учитывает ограничение cpuset контейнера, в отличие от os.cpu_count()
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = settings.WEB_WORKERS or available_cpus()
+worker_class = "app.server.TunedUvicornWorker"
+preload_app = True
+
+# плавный перезапуск воркеров против утечек памяти; разброс, чтобы они не перезапускались одновременно
+max_requests = settings.WEB_MAX_REQUESTS
+max_requests_jitter = settings.WEB_MAX_REQUESTS_JITTER
+graceful_timeout = 30
+timeout = 60
+keepalive = 5
+
+if settings.DB_CONNECTION_BUDGET:
+    per_worker = max(settings.DB_CONNECTION_BUDGET // workers, 1)
+    # настройки читаются движком при импорте приложения, который в мастере происходит после этого файла
+    settings.DB_MAX_OVERFLOW = per_worker // 3
+    settings.DB_POOL_SIZE = per_worker - settings.DB_MAX_OVERFLOW
+
+
+def on_starting(server):
+    server.log.info("Starting %s workers, DB pool %s + %s overflow per worker",
+                    workers, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
+
+
+def post_fork(server, worker):
+    # соединения, унаследованные от мастера, не должны использоваться в дочернем процессе
+    from app.database import engine
+
+    engine.sync_engine.dispose(close=False)
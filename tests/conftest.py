@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.config import settings
+from app.database import Base, engine
+from app.main import app
+
+TABLES = ("reports", "comments", "advertisements", "categories", "users", "superusers")
+
+
+@pytest.fixture(scope="session")
+def run():
+    """
+    Выполнить корутину в общем для сессии цикле событий.
+    Соединения пула движка привязаны к циклу, в котором открыты, поэтому цикл один на все тесты.
+    """
+    with asyncio.Runner() as runner:
+        yield runner.run
+        runner.run(engine.dispose())
+
+
+async def _recreate_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def _drop_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest.fixture(scope="session")
+def database(run):
+    """
+    Пустая схема по моделям в базе DB_NAME. Таблицы пересоздаются, поэтому база должна быть отдельной,
+    с именем на _test; без нее или без доступного Postgres тесты с БД пропускаются.
+    """
+    if not settings.DB_NAME.endswith("_test"):
+        pytest.skip("set DB_NAME to a throwaway database whose name ends with _test")
+    try:
+        run(_recreate_schema())
+    except (OSError, DBAPIError) as error:
+        pytest.skip(f"Postgres is not available: {error}")
+    yield
+    run(_drop_schema())
+
+
+async def truncate_tables():
+    async with engine.begin() as conn:
+        await conn.execute(text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE"))
+
+
+@pytest.fixture
+def client(database, run):
+    """HTTP-клиент приложения в процессе; данные, созданные тестом, удаляются после него."""
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    yield client
+    run(client.aclose())
+    run(truncate_tables())
+
+
+@pytest.fixture
+def user_client(client, run):
+    """Клиент с cookie вошедшего обычного пользователя."""
+    credentials = {"email": "user@example.com", "password": "password"}
+
+    async def login():
+        response = await client.post("/user/register", json={"username": "user", **credentials})
+        assert response.status_code == 200, response.text
+        response = await client.post("/user/login", json=credentials)
+        assert response.status_code == 200, response.text
+
+    run(login())
+    return client
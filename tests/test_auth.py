@@ -0,0 +1,38 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.auth import PasswordHashPool
+
+
+def test_cancelled_request_keeps_slot_until_thread_finishes():
+    async def scenario():
+        pool = PasswordHashPool(workers=1, max_pending=1)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_hash():
+            started.set()
+            release.wait(5)
+
+        request = asyncio.create_task(pool.run(slow_hash))
+        await asyncio.to_thread(started.wait, 5)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        # поток еще хэширует, поэтому новая задача сверх max_pending отклоняется
+        assert pool.pending == 1
+        with pytest.raises(HTTPException) as error:
+            await pool.run(slow_hash)
+        assert error.value.status_code == 429
+
+        release.set()
+        for _ in range(100):
+            if pool.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert pool.pending == 0
+        assert await pool.run(lambda: "hashed") == "hashed"
+
+    asyncio.run(scenario())
@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.cache import CategoryRegistry, InMemoryCacheBackend, ResponseCache
+
+
+def category(category_id: int, name: str = "category"):
+    return SimpleNamespace(id=category_id, name=name)
+
+
+def test_registry_miss_falls_back_to_primary_key_lookup():
+    async def scenario():
+        found = []
+
+        async def loader(session):
+            return [category(1)]
+
+        async def finder(category_id, session):
+            found.append(category_id)
+            return category(category_id) if category_id == 2 else None
+
+        registry = CategoryRegistry(loader, finder, ttl=300)
+        assert await registry.exists(1)
+        # категория 2 создана в другом воркере после загрузки реестра
+        assert await registry.exists(2)
+        assert await registry.exists(2)
+        assert not await registry.exists(3)
+        assert found == [2, 3]
+        assert registry.stats()["loads"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_registry_drops_load_started_before_invalidate():
+    async def scenario():
+        loading, finish = asyncio.Event(), asyncio.Event()
+        loads = []
+
+        async def loader(session):
+            loads.append(len(loads))
+            if len(loads) == 1:
+                loading.set()
+                await finish.wait()
+                return [category(1, "deleted meanwhile")]
+            return []
+
+        async def finder(category_id, session):
+            return None
+
+        registry = CategoryRegistry(loader, finder, ttl=300)
+        stale = asyncio.create_task(registry.get_names())
+        await loading.wait()
+        registry.invalidate()
+        finish.set()
+        # загрузившему запросу отдаются его данные, но в реестр они не попадают
+        assert await stale == {1: "deleted meanwhile"}
+        assert not registry.stats()["loaded"]
+        assert not await registry.exists(1)
+        assert len(loads) == 2
+
+    asyncio.run(scenario())
+
+
+def test_response_cache_skips_store_after_concurrent_invalidation():
+    async def scenario():
+        cache = ResponseCache(InMemoryCacheBackend(maxsize=16), ttl=30)
+        started = cache.begin()
+        # запись зафиксирована и сбросила тег, пока читатель получал старые данные
+        cache.invalidate(["adv:1"])
+        await cache.store("stale", {"title": "old"}, ["adv:1", "advs"], started)
+        assert await cache.get("stale") is None
+
+        await cache.store("other", {"title": "untouched"}, ["adv:2"], started)
+        assert await cache.get("other") is not None
+
+        started = cache.begin()
+        await cache.store("fresh", {"title": "new"}, ["adv:1"], started)
+        assert await cache.get("fresh") is not None
+
+        cache.clear()
+        await cache.store("cleared", {}, ["adv:3"], started)
+        assert await cache.get("cleared") is None
+        assert cache.stats()["skipped_stale"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_response_cache_evicted_generations_raise_floor():
+    async def scenario():
+        cache = ResponseCache(InMemoryCacheBackend(maxsize=16), ttl=30, generations_size=2)
+        started = cache.begin()
+        for adv_id in range(3):
+            cache.invalidate([f"adv:{adv_id}"])
+        # номер сброса adv:0 вытеснен, поэтому старое чтение с любым тегом не сохраняется
+        await cache.store("key", {}, ["adv:9"], started)
+        assert await cache.get("key") is None
+
+    asyncio.run(scenario())
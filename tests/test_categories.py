@@ -0,0 +1,33 @@
+from sqlalchemy import text
+
+from app.database import engine
+
+
+async def execute(statement: str):
+    """Изменение в обход реестра этого процесса, как если бы его сделал другой воркер."""
+    async with engine.begin() as conn:
+        result = await conn.execute(text(statement))
+        return result.scalar() if result.returns_rows else None
+
+
+def create_adv(client, run, category_id: int):
+    return run(client.post("/adv/create", json={"category_id": category_id, "title": "title",
+                                                "description": "description"}))
+
+
+def test_category_created_on_another_worker_is_accepted(user_client, run):
+    first = run(execute("INSERT INTO categories (name) VALUES ('first') RETURNING id"))
+    assert create_adv(user_client, run, first).status_code == 200
+    second = run(execute("INSERT INTO categories (name) VALUES ('second') RETURNING id"))
+    assert create_adv(user_client, run, second).status_code == 200
+    assert create_adv(user_client, run, second + 1).status_code == 404
+
+
+def test_category_deleted_on_another_worker_returns_404(user_client, run):
+    category_id = run(execute("INSERT INTO categories (name) VALUES ('doomed') RETURNING id"))
+    assert create_adv(user_client, run, category_id).status_code == 200
+    run(execute(f"DELETE FROM advertisements WHERE category_id = {category_id}"))
+    run(execute(f"DELETE FROM categories WHERE id = {category_id}"))
+    response = create_adv(user_client, run, category_id)
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Category not found"}
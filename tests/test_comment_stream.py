@@ -0,0 +1,45 @@
+from sqlalchemy import text
+from starlette.requests import Request
+
+from app.config import settings
+from app.database import engine
+from app.dependences import comment_hub
+from app.routers.adv import stream_advertisement_comments
+
+
+async def seed_comments(count: int):
+    async with engine.begin() as conn:
+        await conn.execute(text("INSERT INTO users (username, email) VALUES ('author', 'author@example.com')"))
+        await conn.execute(text("INSERT INTO categories (name) VALUES ('category')"))
+        await conn.execute(text("INSERT INTO advertisements (title, description, user_id, category_id) "
+                                "VALUES ('adv', 'description', 1, 1)"))
+        await conn.execute(text("INSERT INTO comments (content, user_id, advertisement_id) "
+                                "SELECT 'comment ' || n, 1, 1 FROM generate_series(1, :count) AS n"),
+                           {"count": count})
+
+
+def event_id(event: str) -> int:
+    return int(event.split("\n", 1)[0].removeprefix("id: "))
+
+
+def test_reconnect_backfills_every_page_and_skips_only_backfilled_ids(client, run, monkeypatch):
+    monkeypatch.setattr(settings, "SSE_BUFFER_SIZE", 2)
+    run(seed_comments(7))
+    request = Request({"type": "http", "headers": [(b"last-event-id", b"1")]})
+
+    async def stream():
+        response = await stream_advertisement_comments(1, request, session=None)
+        events = response.body_iterator
+        try:
+            assert await anext(events) == "retry: 3000\n\n"
+            backfill = [event_id(await anext(events)) for _ in range(6)]
+            # 4 уже отправлен догрузкой; 0 зафиксирован позже, хоть id и меньше Last-Event-ID
+            comment_hub.deliver(1, "{}", 4)
+            comment_hub.deliver(1, "{}", 0)
+            live = event_id(await anext(events))
+        finally:
+            await events.aclose()
+        return backfill, live
+
+    assert run(stream()) == ([2, 3, 4, 5, 6, 7], 0)
+    assert comment_hub.stats()["subscribers"] == 0
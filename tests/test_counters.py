@@ -0,0 +1,81 @@
+import asyncio
+
+from sqlalchemy import text
+
+from app.database import async_session_maker, engine
+from app.dbcrud import AdvertisementCRUD, CommentCRUD, ReportCRUD
+from app.profiler import track_queries
+
+
+async def seed_advertisements(count: int):
+    async with engine.begin() as conn:
+        await conn.execute(text("INSERT INTO users (username, email) VALUES ('author', 'author@example.com')"))
+        await conn.execute(text("INSERT INTO categories (name) VALUES ('category')"))
+        await conn.execute(text("INSERT INTO advertisements (title, description, user_id, category_id) "
+                                "SELECT 'adv ' || n, 'description', 1, 1 FROM generate_series(1, :count) AS n"),
+                           {"count": count})
+
+
+async def counters() -> dict[int, tuple[int, int]]:
+    async with engine.connect() as conn:
+        rows = await conn.execute(text("SELECT id, comment_count, version FROM advertisements ORDER BY id"))
+        return {row.id: (row.comment_count, row.version) for row in rows}
+
+
+async def report_counts() -> dict[int, int]:
+    async with engine.connect() as conn:
+        rows = await conn.execute(text("SELECT id, report_count FROM advertisements ORDER BY id"))
+        return dict(rows.all())
+
+
+def test_batch_locks_advertisements_in_id_order(client, run):
+    run(seed_advertisements(3))
+    rows = [{"content": "comment", "user_id": 1, "advertisement_id": adv_id} for adv_id in (3, 1, 3, 2)]
+
+    async def add_many():
+        with track_queries() as trace:
+            await CommentCRUD.add_many(rows)
+        return trace
+
+    trace = run(add_many())
+    assert run(counters()) == {1: (1, 2), 2: (1, 2), 3: (2, 2)}
+    locks = [shape for shape, _, _ in trace.queries if "FOR NO KEY UPDATE" in shape]
+    assert len(locks) == 1 and "ORDER BY advertisements.id" in locks[0], trace.queries
+
+
+def test_overlapping_comment_and_report_batches_do_not_deadlock(client, run):
+    run(seed_advertisements(2))
+    comments = [{"content": "comment", "user_id": 1, "advertisement_id": adv_id} for adv_id in (2, 1)]
+    reports = [{"creator_id": 1, "title": "report", "content": "content", "user_id": 1, "advertisement_id": adv_id}
+               for adv_id in (1, 2)]
+
+    async def write_batches():
+        async with async_session_maker() as comment_session, async_session_maker() as report_session:
+            # обе транзакции держат FOR KEY SHARE на объявлениях, как после INSERT соседней пачки
+            for session in (comment_session, report_session):
+                await session.execute(text("SELECT id FROM advertisements FOR KEY SHARE"))
+
+            async def write(crud, rows, session):
+                await crud.add_many(rows, session=session)
+                await session.commit()
+
+            await asyncio.wait_for(asyncio.gather(write(CommentCRUD, comments, comment_session),
+                                                  write(ReportCRUD, reports, report_session)), timeout=10)
+
+    run(write_batches())
+    assert run(report_counts()) == {1: 1, 2: 1}
+    assert run(counters()) == {1: (1, 3), 2: (1, 3)}
+
+
+def test_reconcile_fixes_counters_and_changes_etag_version(client, run):
+    run(seed_advertisements(2))
+    run(CommentCRUD.add_many([{"content": "comment", "user_id": 1, "advertisement_id": 1}]))
+
+    async def corrupt():
+        async with engine.begin() as conn:
+            await conn.execute(text("UPDATE advertisements SET comment_count = 5 WHERE id = 1"))
+
+    run(corrupt())
+    assert run(AdvertisementCRUD.reconcile_counters()) == (1, 2)
+    # исправленное объявление получает новую версию, поэтому ETag /adv/item/{id} меняется
+    assert run(counters()) == {1: (1, 3), 2: (0, 1)}
@@ -0,0 +1,33 @@
+from sqlalchemy import text
+
+from app.database import engine
+from app.profiler import track_queries
+
+
+async def seed_advertisement(comments: int):
+    async with engine.begin() as conn:
+        await conn.execute(text("INSERT INTO users (username, email) VALUES ('author', 'author@example.com')"))
+        await conn.execute(text("INSERT INTO categories (name) VALUES ('category')"))
+        await conn.execute(text("INSERT INTO advertisements (title, description, user_id, category_id) "
+                                "VALUES ('adv', 'description', 1, 1)"))
+        await conn.execute(text("INSERT INTO comments (content, user_id, advertisement_id) "
+                                "SELECT 'comment ' || n, 1, 1 FROM generate_series(1, :count) AS n"),
+                           {"count": comments})
+
+
+def test_detail_takes_two_statements(client, run):
+    run(seed_advertisement(comments=30))
+
+    async def get_detail():
+        with track_queries() as trace:
+            response = await client.get("/adv/item/1/detail", params={"comments_page_size": 20})
+        return response, trace
+
+    response, trace = run(get_detail())
+    assert response.status_code == 200, response.text
+    detail = response.json()
+    assert detail["author"]["username"] == "author" and detail["category"]["name"] == "category"
+    assert len(detail["comments"]) == 20 and detail["has_more_comments"]
+    # объявление с автором и категорией одним JOIN, затем страница комментариев; без ленивых догрузок
+    assert trace.count == 2, trace.queries
+    assert all(origin for _, _, origin in trace.queries), trace.queries
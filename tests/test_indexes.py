@@ -0,0 +1,80 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, text
+
+from app.database import engine
+from app.dbcrud import AdvertisementCRUD, CommentCRUD, ReportCRUD
+from tests.conftest import truncate_tables
+
+# данных и категорий достаточно, чтобы планировщик предпочел индекс чтению по первичному ключу с фильтром
+# или последовательному чтению с сортировкой
+SEED = (
+    "INSERT INTO users (username, email) SELECT 'user' || n, 'user' || n || '@example.com' "
+    "FROM generate_series(1, 100) AS n",
+    "INSERT INTO categories (name) SELECT 'category ' || n FROM generate_series(1, 200) AS n",
+    "INSERT INTO advertisements (title, description, user_id, category_id) "
+    "SELECT 'adv ' || n, 'description', 1 + n % 100, 1 + n % 200 FROM generate_series(1, 20000) AS n",
+    "INSERT INTO comments (content, user_id, advertisement_id) "
+    "SELECT 'comment', 1 + n % 100, 1 + n % 20000 FROM generate_series(1, 40000) AS n",
+    "INSERT INTO reports (title, content, creator_id, user_id, advertisement_id, created_at) "
+    "SELECT 'report', 'content', 1, 1 + n % 100, 1 + n % 20000, current_date - n % 365 "
+    "FROM generate_series(1, 5000) AS n",
+    "ANALYZE users, categories, advertisements, comments, reports",
+)
+
+
+@pytest.fixture(scope="module")
+def seeded(database, run):
+    async def seed():
+        async with engine.begin() as conn:
+            for statement in SEED:
+                await conn.execute(text(statement))
+
+    run(seed())
+    yield
+    run(truncate_tables())
+
+
+@contextmanager
+def captured_statements():
+    """SQL и параметры, которые CRUD-метод передал драйверу."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+
+async def explain(call) -> str:
+    """План последнего запроса, выполненного call(), с теми же параметрами."""
+    with captured_statements() as statements:
+        await call()
+    statement, parameters = statements[-1]
+    async with engine.connect() as conn:
+        plan = await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return "\n".join(plan.scalars())
+
+
+@pytest.mark.parametrize("call, index", [
+    (lambda: AdvertisementCRUD.get_rows_with_pagination(page=1, page_size=20, category_id=3),
+     "ix_advertisements_category_id_id"),
+    (lambda: AdvertisementCRUD.get_rows_with_keyset(page_size=20, after=500, category_id=3),
+     "ix_advertisements_category_id_id"),
+    (lambda: CommentCRUD.get_rows_with_pagination(page=1, page_size=20, advertisement_id=5),
+     "ix_comments_advertisement_id_id"),
+    (lambda: CommentCRUD.get_rows_with_keyset(page_size=20, after=100, advertisement_id=5),
+     "ix_comments_advertisement_id_id"),
+    (lambda: ReportCRUD.get_report_with_pagination(page=1, page_size=20),
+     "ix_reports_created_at_id"),
+], ids=["advertisements by category", "advertisements by category (keyset)", "comments of advertisement",
+        "comments of advertisement (keyset)", "reports by created_at"])
+def test_listing_uses_index(seeded, run, call, index):
+    plan = run(explain(call))
+    assert index in plan, plan
+    assert "Sort" not in plan, plan
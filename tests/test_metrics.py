@@ -0,0 +1,26 @@
+import httpx
+
+from app.main import app
+
+
+def get_metrics(run) -> str:
+    async def fetch():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/metrics")
+            assert response.status_code == 200, response.text
+            return response.text
+
+    return run(fetch())
+
+
+def test_metrics_expose_write_behind_queues(run):
+    lines = get_metrics(run).splitlines()
+    for queue in ("comments", "reports"):
+        assert f"write_behind_{queue}_pending 0.0" in lines
+        assert f"write_behind_{queue}_rejected 0.0" in lines
+
+
+def test_metrics_expose_comment_stream_hub(run):
+    lines = get_metrics(run).splitlines()
+    assert "comment_stream_subscribers 0.0" in lines
+    assert "comment_stream_evicted 0.0" in lines
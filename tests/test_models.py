@@ -0,0 +1,13 @@
+from sqlalchemy.orm import configure_mappers
+
+import app.main  # noqa: F401 - регистрирует все модели и маршруты, как при запуске приложения
+from app.models import Advertisement, User
+
+
+def test_mappers_configure():
+    configure_mappers()
+
+
+def test_advertisement_author_relationship_uses_user_id():
+    assert set(Advertisement.user.property.local_columns) == {Advertisement.__table__.c.user_id}
+    assert User.advertisements.property.mapper.class_ is Advertisement
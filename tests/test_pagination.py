@@ -0,0 +1,41 @@
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.pagination import decode_cursor, encode_cursor
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def test_round_trip():
+    assert decode_cursor(encode_cursor(42)) == (42,)
+    assert decode_cursor(encode_cursor(0.25, 7), types=(float, int)) == (0.25, 7)
+    assert decode_cursor(encode_cursor(3, 7), types=(float, int)) == (3, 7)
+    assert decode_cursor(None) is None
+
+
+@pytest.mark.parametrize("value, types", [
+    (["x"], (int,)),
+    ([None], (int,)),
+    ([True], (int,)),
+    ([1.5], (int,)),
+    ([2 ** 40], (int,)),
+    ([[1]], (int,)),
+    ([1], (int, int)),
+    (["0.5", 1], (float, int)),
+    ([0.5, None], (float, int)),
+    ({"id": 1}, (int,)),
+])
+def test_rejects_malformed_values(value, types):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(raw_cursor(value), types=types)
+    assert error.value.status_code == 400
+
+
+def test_rejects_garbage():
+    with pytest.raises(HTTPException):
+        decode_cursor("not-base64-json")